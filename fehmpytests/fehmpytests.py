@@ -19,23 +19,31 @@ import re
 import numpy as np
 import glob
 import itertools
-from subprocess import call
+import time
+import multiprocessing
+from StringIO import StringIO
+from subprocess import Popen
 from subprocess import PIPE
+from multiprocessing.pool import ThreadPool
 from contextlib import contextmanager
 import shutil
+import hashlib
+import json
+import signal
+import threading
+import sqlite3
 from tpl_write import tpl_write
-
-try:
-    sys.path.insert(0,os.path.join('..','pyfehm'))
-    import fdata
-except ImportError as err:
-    print 'ERROR: Unable to import pyfehm fpost module'
-    print err
-    os._exit(0)
+import metrics
+import readers
+import tolerances
 
 #Suppresses tracebacks
 __unittest = True 
 
+#Serializes starting fehm from the threads of concurrent subcases and
+#test-cases, see fehmTest._execute_fehm().
+_popen_lock = threading.Lock()
+
 class fehmTest(unittest.TestCase):
     """
     Represents a FEHM test-case. 
@@ -51,6 +59,41 @@ class fehmTest(unittest.TestCase):
     Authors: Dylan Harp, Mark Lange
     Updated: June 2014 
     """    
+    
+    #Number of subcase simulations of a test-case run at the same time.
+    subcase_jobs = 1
+    
+    #Number of processes parsing the contour files of a subcase.
+    read_jobs = 1
+    
+    #Directory of cached fehm runs, None disables the run cache.
+    run_cache = None
+    
+    #Directory of parsed comparison files, None parses them on every run.
+    baseline_cache = None
+    
+    #Comparison policy: 'fail-fast' stops at the first failed check, 
+    #'collect-all' compares everything and reports every failed check.
+    #Test methods can override it with the 'policy' parameter.
+    policy = 'fail-fast'
+    
+    #Seconds a fehm simulation may run before it is killed, None for no limit.
+    #Test methods can override it with the 'timeout' parameter.
+    timeout = None
+    
+    #Benchmark mode: number of fehm runs per subcase (0 disables benchmarking),
+    #history database, allowed fractional slowdown versus the baseline, 
+    #number of earlier benchmarks forming the baseline and number of them 
+    #needed before a slowdown is reported.
+    benchmark = 0
+    benchmark_db = '_benchmarks.db'
+    benchmark_threshold = 0.1
+    benchmark_window = 5
+    benchmark_min_history = 3
+    
+    #Recorded wall times in seconds of earlier runs, keyed by test method name
+    #and by 'test-case folder/subcase'. See load_runtimes().
+    runtimes = {}
         
     def __init__(self, testname, log):
         """
@@ -75,6 +118,48 @@ class fehmTest(unittest.TestCase):
             self.fail_log = open('fail_log.txt', 'w')
         
         self.maindir = os.getcwd()
+        
+        #Wall times of this run, see run().
+        self.elapsed = None
+        self.subcase_times = {}
+        
+        #Resource usage of every fehm run of this test, see _run_record().
+        self.runs = []
+        
+        #Benchmark slowdowns found by _run_fehm, reported as a failure once
+        #the test method has made its comparisons.
+        self.regressions = []
+        setattr(self, testname, self._reporting_regressions(
+                                    getattr(self, testname)))
+        
+    def _reporting_regressions(self, method):
+        """
+        Returns the test method followed by a check of self.regressions, so
+        a benchmark slowdown fails the test together with any failed 
+        comparison instead of hiding it.
+        """
+        
+        def test():
+            try:
+                method()
+            except self.failureException as e:
+                if self.regressions:
+                    self.fail('\n\n'.join(self.regressions+[str(e)]))
+                raise
+            if self.regressions:
+                self.fail('\n\n'.join(self.regressions))
+        return test
+        
+    def run(self, result=None):
+        """
+        Runs the test method and records its wall time in self.elapsed.
+        """
+        
+        start = time.time()
+        try:
+            return super(fehmTest, self).run(result)
+        finally:
+            self.elapsed = time.time() - start
     
     # TESTS ######################################################### 
         
@@ -95,10 +180,9 @@ class fehmTest(unittest.TestCase):
         .. Updated May 2016 by Dylan Harp 
         """
 
-        # Change to test directory
-        os.chdir('rad_decay')
+        testdir = os.path.join(self.maindir, 'rad_decay')
         # Import python Bateman equation module
-        sys.path.append('.')
+        if testdir not in sys.path: sys.path.append(testdir)
         from bateman import bateman
 
         # Create parameter dictionary with half lives and initial concentations for I, Xe and Cs
@@ -109,20 +193,20 @@ class fehmTest(unittest.TestCase):
                 'C0_Cs': 1e-30} 
 
         # Create simulation run directory
-        output_dir = '_output'
+        output_dir = os.path.join(testdir, '_output')
         if os.path.exists( output_dir ): shutil.rmtree(output_dir)
         os.mkdir( output_dir )
-        os.chdir(output_dir)
 
         # Write simulation input file using parameter dictionary
-        tpl_write(pars,'../input/run.tpl','run.dat')
+        tpl_write(pars, os.path.join(testdir,'input','run.tpl'),
+                  os.path.join(output_dir,'run.dat'))
         # Run fehm
-        self._run_fehm('')
+        self._run_fehm('', output_dir)
 
         # Collect results
-        CI_fehm = np.genfromtxt('run_135iodine.dat',skip_header=4)
-        CXe_fehm = np.genfromtxt('run_135xenon.dat',skip_header=4)
-        CCs_fehm = np.genfromtxt('run_135cesium.dat',skip_header=4)
+        CI_fehm = np.genfromtxt(os.path.join(output_dir,'run_135iodine.dat'),skip_header=4)
+        CXe_fehm = np.genfromtxt(os.path.join(output_dir,'run_135xenon.dat'),skip_header=4)
+        CCs_fehm = np.genfromtxt(os.path.join(output_dir,'run_135cesium.dat'),skip_header=4)
         times = CI_fehm[:,0]/365.
 
         # Run bateman equation
@@ -147,8 +231,6 @@ class fehmTest(unittest.TestCase):
             if b > 1e-6:
                 self.assertTrue(abs(f-b)/f<0.1, "Concentration mismatch for Cesium at time %g, FEHM: %g, Bateman: %f"%(t,f,b))
 
-        os.chdir(self.maindir)
-
     def saltvcon(self):
         """
         **Test the Salt Variable Conductivity Macro**
@@ -601,6 +683,10 @@ class fehmTest(unittest.TestCase):
                                    'test_measure': str - 'max_difference' or
                                                          'rms_difference' or
                                                          'perc_difference'
+                                   'timeout': float - seconds before each 
+                                                      fehm run is killed
+                                   'tolerances': list[dict] - tolerance rules,
+                                                 see tolerances.py
                                    
         :type parameters: dict
             
@@ -612,14 +698,22 @@ class fehmTest(unittest.TestCase):
         Updated: June 2014 by Mark Lange                                
         """ 
          
-        os.chdir(name)
+        testdir = os.path.join(self.maindir, name)
+        
+        #Compile the tolerance spec of the test-case once for all subcases.
+        parameters = dict(parameters)
+        spec_file = os.path.join(testdir, 'tolerances.json')
+        if parameters.get('tolerances') is not None:
+            parameters['tolerances'] = \
+                tolerances.compile_spec(parameters['tolerances'])
+        elif os.path.isfile(spec_file):
+            parameters['tolerances'] = tolerances.load(spec_file)
         
         #Search for fehmn control files and extract subcases.
-        filenames = glob.glob(os.path.join('input','control','*.files'))
+        filenames = sorted(glob.glob(os.path.join(testdir,'input','control','*.files')))
         subcases  = []
         for filename in filenames:
-            subcase = re.sub(os.path.join('input','control',''), '', filename)
-            subcase = re.sub('.files', '', subcase)
+            subcase = re.sub('.files$', '', os.path.basename(filename))
             
             #File named 'fehmn.files' to be used for tests with single case.
             if subcase != 'fehmn':
@@ -627,41 +721,144 @@ class fehmTest(unittest.TestCase):
             else:
                 subcases = ['']
                 break
+        if len(subcases) == 0:
+            self.fail("Missing fehm control files in "+
+                      os.path.join(testdir,'input','control'))
                 
+        #Create a clean run directory for each subcase.
+        rundirs = []
+        for subcase in subcases:
+            output_dir = os.path.join(testdir, subcase+'_output')
+            if os.path.exists( output_dir ): shutil.rmtree(output_dir)
+            os.mkdir( output_dir )
+            rundirs.append(output_dir)
+        
+        #Simulate and test the subcases on a pool of workers. Every path is
+        #absolute, so the workers share the process without interfering.
+        #Subcases are handed out longest first according to recorded times.
+        keys = [name+'/'+subcase for subcase in subcases]
+        order = sorted(range(len(subcases)), 
+                       key=lambda i: -self.runtimes.get(keys[i], float('inf')))
+        def run_subcase(i):
+            start = time.time()
+            error = self._run_subcase(subcases[i], rundirs[i], parameters)
+            elapsed = time.time() - start
+            #Only passing, freshly simulated subcases give a usable time.
+            cached = [r for r in self.runs 
+                      if r['subcase'] == subcases[i] and r['cached']]
+            if error is None and not cached:
+                self.subcase_times[keys[i]] = elapsed
+            return error
+        pool = ThreadPool(max(1, min(self.subcase_jobs, len(subcases))))
         try:
-            #Test the new files generated with each subcase.
-            for subcase in subcases:
-                parameters['subcase'] = subcase
-                # CD into run directory
-                output_dir = subcase+'_output'
-                if os.path.exists( output_dir ): shutil.rmtree(output_dir)
-                os.mkdir( output_dir )
-                os.chdir( output_dir )
-                filetypes = ['*.avs','*.csv','*.his','*.out','*.trc','*.ptrk']
-                test_flag = False
-                for filetype in filetypes:
-                    parameters['filetype'] = filetype
-                    #Check to make sure there are files of this type.
-                    if len(glob.glob(os.path.join('..','compare','')+'*'+subcase+filetype)) > 0: 
-                        test_method = \
-                          self._test_template(filetype, subcase, parameters)
-                        test_method()
-                        test_flag = True
-                os.chdir( '..' )
-                if not test_flag:
-                    self.fail("Missing any valid comparison files, no test performed")
-                                        
+            errors = dict(zip(order, pool.map(run_subcase, order, 1)))
         finally:
-            #Allows other tests to be performed after exception.
-            os.chdir(self.maindir)
+            pool.close()
+            pool.join()
+        errors = [errors[i] for i in range(len(subcases))]
+        
+        #Report the failures of every subcase together.
+        failures = [(subcase, error) for subcase, error in zip(subcases, errors)
+                    if error is not None]
+        if len(failures) == 1 and len(subcases) == 1:
+            self.fail(failures[0][1])
+        elif failures:
+            msg = '%d of %d subcases failed' % (len(failures), len(subcases))
+            for subcase, error in failures:
+                msg = msg+'\n\n['+subcase+']\n'+error
+            self.fail(msg)
+            
+    def _run_subcase(self, subcase, rundir, parameters):
+        """
+        Runs fehm for a subcase in rundir and compares the new output with the
+        comparison files of the test-case.
+        
+        :param subcase: The name of the subcase.
+        :type subcase: str
+        
+        :param rundir: Absolute path of the subcase run directory.
+        :type rundir: str
+        
+        :param parameters: Attribute values that override default values.
+        :type parameters: dict
+        
+        :returns: None if the subcase passed, else the failure message.
+        """
+        
+        timeout = parameters.get('timeout', self.timeout)
+        regression = None
+        if self.benchmark > 0:
+            error, regression = self._benchmark_fehm(subcase, rundir, timeout)
+        else:
+            error = self._execute_fehm(subcase, rundir, timeout)
+        if error is not None:
+            return error
+        
+        #A slowdown is reported together with the outcome of the comparison.
+        parameters = dict(parameters)
+        parameters['subcase'] = subcase
+        try:
+            self._compare_subcase(subcase, rundir, parameters)
+        except self.failureException as e:
+            if regression is not None:
+                return regression+'\n\n'+str(e)
+            return str(e)
+        return regression
+            
+    def _compare_subcase(self, subcase, rundir, parameters):
+        """
+        Compares the output of a completed subcase run in rundir against every 
+        type of comparison file found for the subcase.
+        
+        :param subcase: The name of the subcase.
+        :type subcase: str
+        
+        :param rundir: Absolute path of the subcase run directory.
+        :type rundir: str
+        
+        :param parameters: Attribute values that override default values.
+        :type parameters: dict
+        """
+        
+        comparedir = os.path.join(os.path.dirname(rundir), 'compare')
+        filetypes = ['*.avs','*.csv','*.his','*.out','*.trc','*.ptrk']
+        collect = parameters.get('policy', self.policy) == 'collect-all'
+        test_flag = False
+        failures = []
+        for filetype in filetypes:
+            parameters['filetype'] = filetype
+            #Check to make sure there are files of this type.
+            if len(glob.glob(os.path.join(comparedir,'*')+subcase+filetype)) > 0: 
+                test_method = \
+                  self._test_template(filetype, subcase, rundir, parameters)
+                test_flag = True
+                try:
+                    try:
+                        test_method()
+                    except ValueError as e:
+                        #Output the readers cannot parse, such as a field 
+                        #that overflowed, fails the comparison.
+                        self.fail('Unreadable %s output: %s' % (filetype, e))
+                except self.failureException as e:
+                    #Keep comparing the other file types when collecting.
+                    if not collect:
+                        raise
+                    failures.append(str(e))
+        if not test_flag:
+            self.fail("Missing any valid comparison files, no test performed")
+        if failures:
+            self.fail('\n'.join(failures))
             
-    def _test_template(self, filetype, subcase, parameters={}):
+    def _test_template(self, filetype, subcase, rundir, parameters={}):
         """
         **Test Template**
         
         Calling this function with the filename and subcase will return the 
         correct test method. 
         
+        :param rundir: Absolute path of the subcase run directory.
+        :type rundir: str
+        
         :param parameters: Stores optional prespecified variable, time, node, 
                            component, and format values to override defaults.
         :type filesfile:   dict 
@@ -677,176 +874,184 @@ class fehmTest(unittest.TestCase):
         values = dict.fromkeys(keys, [])
         values['maxerr'] = 1.e-4
         values['test_measure'] = 'max_difference'
+        values['policy'] = self.policy
+        values['tolerances'] = None
         for key in values:
             if key in parameters:
                 values[key] = parameters[key]                      
         mxerr = values['maxerr']
         components = values['components']
         test_measure = values['test_measure']
-
-        self._run_fehm(subcase)
+        policy = values['policy']
+        spec = values['tolerances']
+        
+        #Glob prefixes for the comparison files and the new output files.
+        old_glob = os.path.join(os.path.dirname(rundir), 'compare', '*')
+        new_glob = os.path.join(rundir, '*')
        
-        def contour_case():      
-            #Find the difference between the old and new
-            f_old = fdata.fcontour(os.path.join('..','compare','*')+subcase+'.'+filetype)
-            f_new = fdata.fcontour('*'+subcase+'.'+filetype)
-            f_dif = fdata.fdiff(f_new, f_old)
-                
-            msg = 'Incorrect %s at time %s.'
+        #Rows of values as a column, broadcasting against the columns.
+        column = lambda values: np.array(values).reshape(-1, 1)
+        
+        #Failed checks kept by the collect-all policy, and the checks made.
+        violations = []
+        checked = [0]
+        
+        def check(keys, dif_rows, old_rows, msg, names, positions=None,
+                  position='step', onset=False, coords=None):
+            #Measure every row of differences into a single quantity at once.
+            #present is False where short rows were padded.
+            dif, present = metrics.stack(dif_rows)
+            old = metrics.stack(old_rows)[0]
+            in_measure = present
+            over = np.zeros(dif.shape, dtype=bool)
+            if spec and coords is not None and len(keys) > 0:
+                #Values covered by the tolerance spec are tested against 
+                #their own thresholds and left out of the test measure.
+                #coords holds the variables, nodes and times of the values.
+                atol, rtol = tolerances.thresholds(spec, dif.shape, *coords)
+                over = tolerances.exceeded(dif, old, atol, rtol, present)
+                in_measure = present & np.isnan(atol)
+            measured = metrics.difference(dif, old, test_measure, 
+                                          present=in_measure)
+            failed = np.union1d(metrics.failures(measured, mxerr),
+                                np.flatnonzero(over.any(axis=-1)))
+            if policy != 'collect-all':
+                failed = failed[:1]
+            worst = metrics.worst(dif, present)
+            if onset and len(failed) > 0:
+                #Locate where each failed row first left tolerance.
+                first = metrics.divergence(dif[failed], old[failed],
+                                           test_measure, mxerr, 
+                                           in_measure[failed])
+                rows = over[failed]
+                first_over = np.where(rows.any(axis=-1), rows.argmax(axis=-1),
+                                      -1)
+                first = np.where((first < 0) | 
+                                 ((first_over >= 0) & (first_over < first)),
+                                 first_over, first)
+            for m, i in enumerate(failed):
+                text = msg%keys[i]
+                if over[i].any():
+                    text += ' %d values exceed their tolerance.'%over[i].sum()
+                if onset and first[m] >= 0:
+                    text += ' First out of tolerance at %s %s.'% \
+                            (position, positions[first[m]])
+                #Write to fail log if switch is on.
+                if self.log:
+                    kvpairs = dict(zip(names, [str(k) for k in keys[i]]))
+                    line = 'Failed at subcase:'+subcase
+                    line = line+' filetype:'+filetype
+                    for key in kvpairs:        
+                        line = line+' '+key+':'+kvpairs[key]
+                    self.fail_log.write(line)   
+                if policy != 'collect-all':
+                    self.fail(text)
+                j = worst[i]
+                where = positions[j] if positions is not None else j+1
+                violations.append((text, measured[i], position, where,
+                                   abs(dif[i][j])))
+            checked[0] += len(keys)
+            return len(keys) > 0
             
-            #If no pre-specified times, grab them from f_dif.
+        def report():
+            #Fails with a summary of every failed check, worst first.
+            if len(violations) == 0:
+                return
+            lines = ['%d of %d checks of %s files failed, %s >= %s:'%
+                     (len(violations), checked[0], filetype, test_measure, 
+                      mxerr)]
+            for text, measured, position, where, largest in \
+                    sorted(violations, key=lambda x: -x[1]):
+                lines.append('  %s %s %.6g, largest difference %.6g at %s %s'%
+                             (text, test_measure, measured, largest, 
+                              position, where))
+            self.fail('\n'.join(lines))
+            
+        def contour_case():      
+            #If no pre-specified times, compare all the common times.
             if len(values['times']) == 0:
-                times = f_dif.times
+                times = None
             else:
                 times = values['times']
+                
+            msg = 'Incorrect %s at time %s.'
             
-            #If no pre-specified variables, grab them from f_dif.         
-            if len(values['variables']) == 0:
-                variables = f_dif.variables
-            else:
-                variables = values['variables']
-            
-            #Check the variables at each time for any significant differences.
+            #Find the difference between the old and new one time step at a
+            #time, checking the variables of each for significant differences.
             test_flag = False
-            for t in times: 
+            steps = readers.contour_diffs(new_glob+subcase+'.'+filetype,
+                                          old_glob+subcase+'.'+filetype,
+                                          times, self.baseline_cache,
+                                          self.read_jobs)
+            for t, f_dif, f_old in steps:
+                #If no pre-specified variables, grab them from f_dif.         
+                if len(values['variables']) == 0:
+                    variables = f_dif.variables
+                else:
+                    variables = values['variables']
                 #Its possible some times do not have all variables in f_dif.
-                for v in np.intersect1d(variables, f_dif[t].keys()):
-                    #Measure the difference into a single quantity.
-                    f_dif[t][v] = map(abs, f_dif[t][v])
-                    f_old[t][v] = map(abs, f_old[t][v])
-                    difference = { 
-                        'max_difference': max(f_dif[t][v]),
-                        'rms_difference': np.sqrt(np.mean(f_dif[t][v])), 
-                        'perc_difference':
-                            sum([x/float(y) 
-                                 for x,y in zip(f_dif[t][v], f_old[t][v])
-                                 if y != 0]) /
-                            float(len(f_dif[t][v]))
-                    }[test_measure]
-                    try:
-                        self.assertTrue(difference<mxerr, msg%(v, t))
-                        test_flag = True
-                    except AssertionError as e:
-                        #Write to fail log if switch is on.
-                        if self.log:
-                            kvpairs = {'variable':str(v), 'time':str(t)}
-                            line = 'Failed at subcase:'+subcase
-                            line = line+' filetype:'+filetype
-                            for key in kvpairs:        
-                                line = line+' '+key+':'+kvpairs[key]
-                            self.fail_log.write(line)   
-                        raise e
+                keys = [(v, t) for v in 
+                        np.intersect1d(variables, f_dif[t].keys())]
+                coords = (column([v for v, t in keys]), f_dif.nodes, t)
+                if check(keys, 
+                         [f_dif[t][v] for v, t in keys],
+                         [f_old[t][v] for v, t in keys],
+                         msg, ['variable', 'time'], f_dif.nodes, 'node',
+                         coords=coords):
+                    test_flag = True
+            report()
             if not test_flag:
                 self.fail("Missing common nodes in compare and output contour files, no test performed")
-        def history_case():
-            #Find the difference between the old and new
-            f_old = fdata.fhistory(os.path.join('..','compare','*')+subcase+filetype) 
-            f_new = fdata.fhistory('*'+subcase+filetype)
-            f_dif = fdata.fdiff(f_new, f_old)
-
-            #If no pre-specified variables, grab them from f_dif.         
-            if len(values['variables']) == 0:
-                variables = f_dif.variables
-            else:
-                variables = values['variables']
-            
-            #If no pre-specifed nodes, grab them from f_dif.
-            if len(values['nodes']) == 0:
-                nodes = f_dif.nodes
-            else:
-                nodes = values['nodes']   
+        def series_case(kind, name):
+            #If no pre-specified variables, compare all the common ones.
+            variables = values['variables']
             msg = 'Incorrect %s at node %s.'  
             
-            #Check the nodes at each variable for any significant differences.   
+            #Find the difference between the old and new one variable at a
+            #time, checking its nodes for any significant differences.
             test_flag = False
-            for v in variables:
+            series = readers.history_diffs(new_glob+subcase+filetype,
+                                           old_glob+subcase+filetype,
+                                           kind, self.baseline_cache)
+            for v, f_dif, f_old in series:
+                if len(variables) > 0 and v not in variables:
+                    continue
+                #If no pre-specifed nodes, take every node of f_dif.
+                if len(values['nodes']) == 0:
+                    nodes = None
+                else:
+                    nodes = values['nodes']   
                 #Its possible some variables do not have all nodes in f_dif.
-                for n in np.intersect1d(nodes, f_dif[v].keys()):  
-                    f_dif[v][n] = map(abs, f_dif[v][n])
-                    difference = { 
-                        'max_difference': max(f_dif[v][n]),
-                        'rms_difference': np.sqrt(np.mean(f_dif[v][n])), 
-                        'perc_difference':
-                            sum([x/float(y) 
-                                 for x,y in zip(f_dif[v][n], f_old[v][n])
-                                 if y != 0]) /
-                            float(len(f_dif[v][n]))
-                    }[test_measure]
-                    try:   
-                        self.assertTrue(difference<mxerr, msg%(v, n))
-                        test_flag = True
-                    except AssertionError as e:
-                        #Write to fail log if switch is on.
-                        if self.log:
-                            kvpairs = {'variable':str(v), 'node':str(n)}
-                            line = 'Failed at subcase:'+subcase
-                            line = line+' filetype:'+filetype
-                            for key in kvpairs:        
-                                line = line+' '+key+':'+kvpairs[key]
-                            self.fail_log.write(line)   
-                        raise e
+                nodes, dif_rows = f_dif.select(v, nodes)
+                nodes, old_rows = f_old.select(v, nodes)
+                keys = [(v, n) for n in nodes.tolist()]
+                coords = (v, column(nodes), f_dif.times)
+                if check(keys, dif_rows, old_rows, msg, ['variable', 'node'], f_dif.times, 'time',
+                         onset=True, coords=coords):
+                    test_flag = True
+            report()
             if not test_flag:
-                self.fail("Missing common nodes in compare and output history files, no test performed")
+                self.fail("Missing common nodes in compare and output %s files, no test performed"%name)
+                
+        def history_case():
+            series_case(readers.fhistory, 'history')
                     
         def tracer_case():
-            #Find the difference between the old and new
-            f_old = fdata.ftracer(os.path.join('..','compare','*')+subcase+filetype) 
-            f_new = fdata.ftracer('*'+subcase+filetype)
-            f_dif = fdata.fdiff(f_new, f_old)
-            
-            #If no pre-specified variables, grab them from f_dif.         
-            if len(values['variables']) == 0:
-                variables = f_dif.variables
-            else:
-                variables = values['variables']
-            
-            #If no pre-specifed nodes, grab them from f_dif.
-            if len(values['nodes']) == 0:
-                nodes = f_dif.nodes
-            else:
-                nodes = values['nodes']    
-
-            msg = 'Incorrect %s at node %s.'  
-            
-            #Check the nodes at each variable for any significant differences.
-            test_flag = False
-            for v in variables:
-                #Its possible some variables do not have all nodes in f_dif.
-                for n in np.intersect1d(nodes, f_dif[v].keys()):
-                    #Measure the difference into a single quantity.
-                    f_dif[v][n] = map(abs, f_dif[v][n])
-                    difference = { 
-                        'max_difference': max(f_dif[v][n]),
-                        'rms_difference': np.sqrt(np.mean(f_dif[v][n])), 
-                        'perc_difference':
-                            sum([x/float(y) 
-                                 for x,y in zip(f_dif[v][n], f_old[v][n])
-                                 if y != 0]) /
-                            float(len(f_dif[v][n]))
-                    }[test_measure]     
-                    try:
-                        self.assertTrue(difference<mxerr, msg%(v, n))
-                        test_flag = True
-                    except AssertionError as e:
-                        #Write to fail log if switch is on.
-                        if self.log:
-                            kvpairs = {'variable':str(v), 'node':str(n)}
-                            line = 'Failed at subcase:'+subcase
-                            line = line+' filetype:'+filetype
-                            for key in kvpairs:        
-                                line = line+' '+key+':'+kvpairs[key]
-                            self.fail_log.write(line)   
-                        raise e   
-            if not test_flag:
-                self.fail("Missing common nodes in compare and output tracer files, no test performed")
+            series_case(readers.ftracer, 'tracer')
             
         def output_case():
             #Find difference between old and new file assume 1 file per subcase.
-            old_filename = glob.glob(os.path.join('..','compare','*')+subcase+filetype)[0]
-            new_filename = glob.glob('*'+subcase+filetype)[0]
-            f_old = fdata.foutput(old_filename)
-            f_new = fdata.foutput(new_filename)
-            f_dif = fdata.fdiff(f_new, f_old)
+            old_filename = glob.glob(old_glob+subcase+filetype)[0]
+            #FEHM also writes run.internode_fluxes.out next to run.out, so
+            #take the output file named in the control file.
+            outfile = _output_files(os.path.join(rundir, 
+                                                 _filesfile(subcase)))[0]
+            new_filename = os.path.join(rundir, outfile or subcase+'.out')
+            if not os.path.isfile(new_filename):
+                new_filename = glob.glob(new_glob+subcase+filetype)[0]
+            f_old = readers.foutput(old_filename, self.baseline_cache)
+            f_new = readers.foutput(new_filename)
+            f_dif = readers.fdiff(f_new, f_old)
             
             #If no pre-specified variables, grab them from f_dif.         
             if len(values['variables']) == 0:
@@ -854,9 +1059,9 @@ class fehmTest(unittest.TestCase):
             else:
                 variables = values['variables']
 
-            #If no pre-specifed nodes, grab them from f_dif.
+            #If no pre-specifed nodes, take every node of f_dif.
             if len(values['nodes']) == 0:
-                nodes = f_dif.nodes
+                nodes = None
             else:
                 nodes = values['nodes']
                 
@@ -869,44 +1074,31 @@ class fehmTest(unittest.TestCase):
             msg = 'Incorrect %s at %s node %s.'  
             
             #Check the node at each component for significant differences.   
-            test_flag = False
+            keys = []
+            variables = sorted(set(variables))
             for c in components:
-                for n in np.intersect1d(nodes, f_dif.node[c].keys()):
-                    for v in np.intersect1d(variables, f_dif.node[c][n].keys()):
-                        #Measure the difference into a single quantity.
-                        fdiff_array = map(abs, f_dif.node[c][n][v])
-                        difference = { 
-                            'max_difference': max(fdiff_array),
-                            'rms_difference': np.sqrt(np.mean(fdiff_array)),
-                            'perc_difference':
-                                sum([x/float(y) 
-                                     for x,y in zip(fdiff_array, fdiff_array)
-                                     if y != 0]) /
-                                float(len(fdiff_array)) 
-                        }[test_measure]
-                        try:
-                            self.assertTrue(difference < mxerr, msg%(v,c,n))
-                    	    test_flag = True
-                        except AssertionError as e:
-                            #Write to fail log if switch is on.
-                            if self.log:
-                                kvpairs = { 'component': str(c), 
-                                            'node': str(n),
-                                            'variable': str(v), }
-                                line = 'Failed at subcase:'+subcase
-                                line = line+' filetype:'+filetype
-                                for key in kvpairs:        
-                                    line = line+' '+key+':'+kvpairs[key]
-                                self.fail_log.write(line)   
-                            raise e
+                for n in f_dif.select(c, nodes).tolist():
+                    written = f_dif.node[c][n]
+                    keys.extend([(v, c, n) for v in variables if v in written])
+            dif_rows = [f_dif.node[c][n][v] for v, c, n in keys]
+            #Differences only cover the blocks written in both files.
+            old_rows = [f_old.node[c][n][v][:len(row)] 
+                        for row, (v, c, n) in zip(dif_rows, keys)]
+            coords = (column([v for v, c, n in keys]), 
+                      column([n for v, c, n in keys]))
+            test_flag = check(keys, dif_rows, old_rows, msg,
+                              ['variable', 'component', 'node'], 
+                              coords=coords)
+            report()
             if not test_flag:
                 self.fail("Missing common nodes and/or variables in compare and output out files, no test performed")
         
         def ptrack_case():
             #Find the difference between the old and new
-            f_old = fdata.fptrk(os.path.join('..','compare','*')+subcase+filetype)
-            f_new = fdata.fptrk('*'+subcase+filetype)  
-            f_dif = fdata.fdiff(f_new, f_old)
+            f_old = readers.fptrk(old_glob+subcase+filetype,
+                                  self.baseline_cache)
+            f_new = readers.fptrk(new_glob+subcase+filetype)  
+            f_dif = readers.fdiff(f_new, f_old)
             
             msg = 'Incorrect %s.'
             
@@ -916,33 +1108,13 @@ class fehmTest(unittest.TestCase):
             else:
                 variables = values['variables']
                 
-            test_flag = False
-            for v in variables:
-                #Measure the difference into a single quantity.
-                fdiff_array = map(abs, f_dif[v])
-                difference = { 
-                    'max_difference': max(fdiff_array),
-                    'rms_difference': np.sqrt(np.mean(fdiff_array)),
-                    'perc_difference':
-                            sum([x/float(y) 
-                                 for x,y in zip(fdiff_array, fdiff_array)
-                                 if y != 0]) /
-                            float(len(fdiff_array)) 
-                }[test_measure]
-                #Perform test, if fail log switch is on, write a fail log.
-                try:
-                    self.assertTrue(difference < mxerr, msg%v)
-                    test_flag = True
-                except AssertionError as e:
-                    #Write to fail log if switch is on.
-                    if self.log:
-                        kvpairs = {'variable': str(v)}
-                        line = 'Failed at subcase:'+subcase
-                        line = line+' filetype:'+filetype
-                        for key in kvpairs:        
-                            line = line+' '+key+':'+kvpairs[key]
-                        self.fail_log.write(line)   
-                    raise e
+            keys = [(v,) for v in variables]
+            dif_rows = [f_dif[v] for v in variables]
+            old_rows = [f_old[v] for v in variables]
+            coords = (column(variables), None, f_dif.times)
+            test_flag = check(keys, dif_rows, old_rows, msg, ['variable'],
+                              f_dif.times, 'time', coords=coords)
+            report()
             if not test_flag:
                 self.fail("Missing common nodes in compare and output ptrk files, no test performed")
 
@@ -954,62 +1126,583 @@ class fehmTest(unittest.TestCase):
                  '*.out':  output_case, 
                  '*.ptrk': ptrack_case }[filetype]
                                     
-    def _run_fehm(self, subcase):
+    def _run_fehm(self, subcase, rundir=None):
         """ 
         **Utility function to run fehm**
         
         Asserts that fehm terminates successfully.
 
-        :param filesfile: name of fehm files file
-        :type filesfile: str 
+        :param subcase: name of the subcase, '' for fehmn.files
+        :type subcase: str 
+        
+        :param rundir: directory to run fehm in, defaults to the current one
+        :type rundir: str
         """
         
-        #Find the control file for the test-case or for the subcase. 
-        if subcase == '':
-            filesfile = os.path.join('..','input','control','fehmn.files')
+        if rundir is None:
+            rundir = os.getcwd()
+        if self.benchmark > 0:
+            error, regression = self._benchmark_fehm(subcase, rundir, 
+                                                     self.timeout)
+            #Report a slowdown after the comparisons of the test method ran.
+            if error is None and regression is not None:
+                self.regressions.append(regression)
         else:
-            filesfile = os.path.join('..','input','control',subcase+'.files')
+            error = self._execute_fehm(subcase, rundir, self.timeout)
+        self.assertTrue(error is None, error)
+        
+    def _benchmark_fehm(self, subcase, rundir, timeout=None):
+        """
+        Runs fehm self.benchmark times for a subcase, stores timing statistics
+        and the solver effort reported in the output file in the benchmark 
+        history database and compares the fastest wall time with the rolling 
+        baseline of earlier benchmarks of the same subcase.
+        
+        The baseline is the median of the fastest wall times of the last 
+        self.benchmark_window benchmarks that were not slowdowns themselves. 
+        A slowdown is reported once self.benchmark_min_history of them exist,
+        if the fastest wall time exceeds the baseline by more than the 
+        self.benchmark_threshold fraction plus three scaled median absolute 
+        deviations of the baseline benchmarks, so ordinary timing noise 
+        passes.
+        
+        :param subcase: name of the subcase, '' for fehmn.files
+        :type subcase: str 
+        
+        :param rundir: absolute path of the directory to run fehm in
+        :type rundir: str
+        
+        :param timeout: seconds before a fehm run is killed, None for no limit
+        :type timeout: float
+        
+        :returns: tuple of None if all runs succeeded, else an error message,
+                  and None if there was no slowdown, else a message describing
+                  it.
+        """
+        
+        for i in range(self.benchmark):
+            error = self._execute_fehm(subcase, rundir, timeout, False)
+            if error is not None:
+                return error, None
+        records = [r for r in self.runs 
+                   if r['subcase'] == subcase and not r['cached']]
+        wall = np.array([r['wall'] for r in records[-self.benchmark:]])
+        cpu = np.array([r.get('user', np.nan)+r.get('sys', np.nan) 
+                        for r in records[-self.benchmark:]])
+        
+        outfile, errfile = _output_files(os.path.join(rundir, 
+                                                      _filesfile(subcase)))
+        effort = _solver_effort(os.path.join(rundir, outfile))
+        
+        row = { 'test': self._testMethodName,
+                'subcase': subcase,
+                'recorded': time.time(),
+                'exe': _file_digest(exe),
+                'runs': len(wall),
+                'wall_mean': wall.mean(),
+                'wall_median': np.median(wall),
+                'wall_min': wall.min(),
+                'wall_std': wall.std(),
+                'cpu_mean': cpu.mean(),
+                'maxrss_kb': max(r.get('maxrss_kb', 0) 
+                                 for r in records[-self.benchmark:]) }
+        row.update(effort)
+        
+        db = sqlite3.connect(self.benchmark_db, timeout=60)
+        try:
+            db.execute("""CREATE TABLE IF NOT EXISTS benchmarks 
+                (test TEXT, subcase TEXT, recorded REAL, exe TEXT, runs INTEGER,
+                 wall_mean REAL, wall_median REAL, wall_min REAL, wall_std REAL,
+                 cpu_mean REAL, maxrss_kb INTEGER, timesteps INTEGER, 
+                 newton_iterations INTEGER, solver_iterations INTEGER,
+                 regressed INTEGER)""")
+            #Databases written before slowdowns were flagged lack the column.
+            columns = [c[1] for c in db.execute('PRAGMA table_info(benchmarks)')]
+            if 'regressed' not in columns:
+                db.execute('ALTER TABLE benchmarks ADD COLUMN regressed INTEGER')
+            history = db.execute("""SELECT wall_min, timesteps, 
+                newton_iterations, solver_iterations FROM benchmarks 
+                WHERE test=? AND subcase=? AND NOT coalesce(regressed, 0)
+                ORDER BY recorded DESC LIMIT ?""",
+                (row['test'], subcase, self.benchmark_window)).fetchall()
+            
+            regression = None
+            if len(history) >= max(self.benchmark_min_history, 1):
+                times = np.array([h[0] for h in history])
+                baseline = np.median(times)
+                spread = 1.4826*np.median(np.abs(times-baseline))
+                limit = baseline*(1.+self.benchmark_threshold) + 3.*spread
+                if row['wall_min'] > limit:
+                    regression = 'Benchmark regression: fastest wall time '\
+                        '%.3fs of %d runs is %.0f%% above the baseline of '\
+                        '%.3fs (median of the last %d benchmarks, limit '\
+                        '%.3fs)' % (row['wall_min'], len(wall), 
+                        100.*(row['wall_min']/baseline-1.), baseline, 
+                        len(history), limit)
+                    names = ['timesteps', 'newton_iterations', 
+                             'solver_iterations']
+                    for name, last in zip(names, history[0][1:]):
+                        if row[name] != last:
+                            regression = regression+'\n%s changed from %s '\
+                                'to %s' % (name, last, row[name])
+            
+            row['regressed'] = int(regression is not None)
+            keys = sorted(row.keys())
+            db.execute('INSERT INTO benchmarks (%s) VALUES (%s)' % 
+                       (','.join(keys), ','.join('?'*len(keys))),
+                       [row[k] for k in keys])
+            db.commit()
+        finally:
+            db.close()
+        return None, regression
+        
+    def _execute_fehm(self, subcase, rundir, timeout=None, use_cache=True):
+        """ 
+        Runs fehm for a subcase inside rundir without changing the working 
+        directory of the harness, so several runs can proceed at once.
+        
+        A watchdog kills the process group of fehm if it is still running
+        after timeout seconds, so a stalled simulation fails instead of 
+        blocking the suite.
+        
+        :param subcase: name of the subcase, '' for fehmn.files
+        :type subcase: str 
+        
+        :param rundir: absolute path of the directory to run fehm in
+        :type rundir: str
+        
+        :param timeout: seconds before fehm is killed, None for no limit
+        :type timeout: float
+        
+        :param use_cache: restore and store outputs in the run cache if it is
+                          enabled
+        :type use_cache: bool
+        
+        :returns: None if fehm terminated successfully, else an error message.
+        """
+        
+        filesfile = _filesfile(subcase)
+            
+        #Restore the outputs of an earlier successful run of the same inputs.
+        key = None
+        if self.run_cache is not None and use_cache:
+            key = self._run_key(filesfile, rundir)
+        if key is not None:
+            cached = os.path.join(self.run_cache, key)
+            if os.path.isdir(cached):
+                start = time.time()
+                _copy_into(cached, rundir)
+                self.runs.append({'subcase': subcase, 'cached': True, 
+                                  'wall': time.time()-start})
+                return None
             
         evalstr = exe+' '+filesfile
+        start = time.time()
         
+        #Start fehm in its own process group so the watchdog can kill the 
+        #shell together with fehm. preexec_fn is not thread-safe in Python 2,
+        #so only one thread forks at a time.
         with open(os.devnull, "w") as f:
-            call(evalstr, shell=True, stdout=f)
-        
-        outfile = None
-        errfile = 'fehmn.err'
-
-        with open( filesfile, 'r' ) as f:
-            lines = f.readlines()
-            # Check for new filesfile format
-            for line in lines:
-                if 'outp' in line:
-                    outfile = line.split(':')[1].strip()
-                elif 'error' in line:
-                    errfile = line.split(':')[1].strip()
-                           
-            # Assume old format
-            if outfile is None and ':' not in lines[0]: 
-                outfile=lines[3].strip()
+            with _popen_lock:
+                if hasattr(os, 'setsid'):
+                    p = Popen(evalstr, shell=True, stdout=f, cwd=rundir, 
+                              preexec_fn=os.setsid)
+                else:
+                    p = Popen(evalstr, shell=True, stdout=f, cwd=rundir)
+            timed_out = []
+            def kill():
+                timed_out.append(True)
+                try:
+                    if hasattr(os, 'killpg'):
+                        os.killpg(p.pid, signal.SIGKILL)
+                    else:
+                        p.kill()
+                except OSError:
+                    pass
+            watchdog = None
+            if timeout is not None:
+                watchdog = threading.Timer(timeout, kill)
+                watchdog.daemon = True
+                watchdog.start()
+            try:
+                #wait4 reports the resources used by this fehm run alone, 
+                #even while other runs proceed in other threads.
+                if hasattr(os, 'wait4'):
+                    pid, status, usage = os.wait4(p.pid, 0)
+                    if os.WIFSIGNALED(status):
+                        p.returncode = -os.WTERMSIG(status)
+                    else:
+                        p.returncode = os.WEXITSTATUS(status)
+                else:
+                    p.wait()
+                    usage = None
+            finally:
+                if watchdog is not None:
+                    watchdog.cancel()
+        self.runs.append(_run_record(subcase, rundir, p.returncode, 
+                                     time.time()-start, usage))
+        
+        outfile, errfile = _output_files(os.path.join(rundir, filesfile))
  
+        #fehm writes 'End Date' into the banner closing the output file.
         complete = False
-        if outfile:
-            with open(outfile, 'r' ) as f:
-                for line in reversed(f.readlines()):
-                    if 'End Date' in line:
-                        complete = True
-                        break
+        if outfile and os.path.exists(os.path.join(rundir, outfile)):
+            complete = 'End Date' in _tail(os.path.join(rundir, outfile))
+                        
+        if complete:
+            if key is not None:
+                self._store_run(key, rundir)
+            return None
                         
-        if os.path.exists(errfile): 
-            errstr = open( errfile, 'r' ).read()
+        if os.path.exists(os.path.join(rundir, errfile)): 
+            errstr = _tail(os.path.join(rundir, errfile))
         else: 
             errstr = ''
-        # Change to maindir in case assertTrue fails    
-        curdir = os.getcwd() 
-        os.chdir(self.maindir)
         
-        msg = 'Unsuccessful fehm simulation\nContents of '
-        self.assertTrue(complete, msg+errfile+':\n\n'+errstr)
-        os.chdir(curdir)
+        msg = 'Unsuccessful fehm simulation\n'
+        if timed_out:
+            msg = msg+'Killed after exceeding the timeout of %gs\n' % timeout
+        if outfile and os.path.exists(os.path.join(rundir, outfile)):
+            step = _last_timestep(os.path.join(rundir, outfile))
+            if step is None:
+                msg = msg+'No time step completed\n'
+            else:
+                msg = msg+'Last time step reached: %d at %s days\n' % step
+        msg = msg+'Contents of '
+        return msg+errfile+':\n\n'+errstr
+                     
+    def _run_key(self, filesfile, rundir):
+        """
+        Computes the run cache key of a fehm run. 
+        
+        The key is a hash of the fehm executable, the control file and every
+        file the control file references, followed transitively through the 
+        paths named inside those files (grid, stor, zone, rock, _resources 
+        files, ...). Paths are resolved relative to rundir, as fehm does, but
+        only files in the input folder of the test-case and in _resources are
+        followed, so outputs left in run directories never change the key.
+        
+        :param filesfile: path of the control file relative to rundir
+        :type filesfile: str
+        
+        :param rundir: absolute path of the run directory
+        :type rundir: str
+        
+        :returns: hexadecimal digest, or None if the control file names a file
+                  that already exists in rundir, such as a deck written from a
+                  template, whose inputs the key cannot tell.
+        """
+        
+        rundir = os.path.normpath(rundir)
+        roots = [os.path.join(os.path.dirname(rundir), 'input'),
+                 os.path.join(self.maindir, '_resources')]
+        def in_tree(path):
+            return any(path.startswith(root+os.sep) for root in roots)
+        
+        sha = hashlib.sha1(_file_digest(exe))
+        pending = [filesfile]
+        visited = set()
+        while pending:
+            name = pending.pop(0)
+            path = os.path.normpath(os.path.join(rundir, name))
+            if path in visited:
+                continue
+            visited.add(path)
+            sha.update(name+'\0'+_file_digest(path))
+            
+            #Only small text files (control and input decks) name other files.
+            if os.path.getsize(path) > 1000000:
+                continue
+            with open(path, 'rb') as f:
+                text = f.read()
+            if '\0' in text[:8192]:
+                continue
+            for token in text.split():
+                token = token.strip('\'",')
+                if '/' not in token and '.' not in token:
+                    continue
+                target = os.path.normpath(os.path.join(rundir, token))
+                try:
+                    if not os.path.isfile(target):
+                        continue
+                except (TypeError, ValueError):
+                    continue
+                if in_tree(target):
+                    pending.append(token)
+                elif name == filesfile and target.startswith(rundir+os.sep):
+                    return None
+        return sha.hexdigest()
+        
+    def _store_run(self, key, rundir):
+        """
+        Copies the outputs of a successful fehm run into the run cache.
+        
+        :param key: run cache key from _run_key
+        :type key: str
+        
+        :param rundir: absolute path of the run directory
+        :type rundir: str
+        """
+        
+        cached = os.path.join(self.run_cache, key)
+        if os.path.isdir(cached):
+            return
+        #Fill a private directory first so readers never see a partial entry.
+        tmpdir = cached+'.%d.%d' % (os.getpid(), id(rundir))
+        shutil.copytree(rundir, tmpdir)
+        try:
+            os.rename(tmpdir, cached)
+        except OSError:
+            shutil.rmtree(tmpdir)
+                     
+def _copy_into(src, dst):
+    """
+    Copies the files and folders in src into the existing folder dst, 
+    replacing files of the same name.
+    
+    :param src: path of the folder to copy from
+    :type src: str
+    
+    :param dst: path of the folder to copy into
+    :type dst: str
+    """
+    
+    for filename in os.listdir(src):
+        path = os.path.join(src, filename)
+        target = os.path.join(dst, filename)
+        if os.path.isdir(path):
+            if not os.path.isdir(target):
+                os.mkdir(target)
+            _copy_into(path, target)
+        else:
+            shutil.copy2(path, target)
+            
+def _filesfile(subcase):
+    """
+    Returns the path of the control file of a subcase relative to its run
+    directory, 'fehmn.files' for tests with a single case.
+    """
+    
+    if subcase == '':
+        return os.path.join('..','input','control','fehmn.files')
+    else:
+        return os.path.join('..','input','control',subcase+'.files')
+        
+def _output_files(filesfile):
+    """
+    Finds the names of the output and error files in a fehm control file.
+    
+    :param filesfile: path of the control file
+    :type filesfile: str
+    
+    :returns: tuple of the output file name (None if there is none) and the
+              error file name, relative to the run directory.
+    """
+    
+    outfile = None
+    errfile = 'fehmn.err'
+
+    with open( filesfile, 'r' ) as f:
+        lines = f.readlines()
+        # Check for new filesfile format
+        for line in lines:
+            if 'outp' in line:
+                outfile = line.split(':')[1].strip()
+            elif 'error' in line:
+                errfile = line.split(':')[1].strip()
+                       
+        # Assume old format
+        if outfile is None and ':' not in lines[0]: 
+            outfile=lines[3].strip()
+    return outfile, errfile
+    
+def _solver_effort(outfile):
+    """
+    Reads the solver effort summary fehm writes at the end of its output file.
+    
+    :param outfile: path of the fehm output file
+    :type outfile: str
+    
+    :returns: dict with the number of time steps, Newton-Raphson iterations 
+              and linear solver iterations, None where not found.
+    """
+    
+    tail = _tail(outfile)
+    patterns = { 'timesteps': r'simulation ended:.*timesteps\s+(\d+)',
+                 'newton_iterations': r'total N-R iterations\s*=\s*(\d+)',
+                 'solver_iterations': r'total solver iterations\s*=\s*(\d+)' }
+    effort = {}
+    for key, pattern in patterns.items():
+        match = re.findall(pattern, tail)
+        effort[key] = int(match[-1]) if match else None
+    return effort
+    
+def _run_record(subcase, rundir, returncode, wall, usage):
+    """
+    Summarizes the cost of a fehm run.
+    
+    :param subcase: name of the subcase
+    :type subcase: str
+    
+    :param rundir: absolute path of the run directory
+    :type rundir: str
+    
+    :param returncode: exit status of fehm, negative for a signal
+    :type returncode: int
+    
+    :param wall: wall time in seconds
+    :type wall: float
+    
+    :param usage: resource usage of the fehm process from os.wait4, or None
+                  where it is not available
+    :type usage: resource.struct_rusage
+    
+    :returns: dict with the wall time, user and system cpu seconds, peak 
+              resident memory in kilobytes, bytes written to storage and 
+              bytes left in the run directory.
+    """
+    
+    output_bytes = 0
+    for filename in os.listdir(rundir):
+        output_bytes += os.path.getsize(os.path.join(rundir, filename))
+    record = { 'subcase': subcase, 
+               'cached': False,
+               'returncode': returncode,
+               'wall': wall,
+               'output_bytes': output_bytes }
+    if usage is not None:
+        #ru_maxrss is in bytes on Mac OS X and in kilobytes elsewhere.
+        maxrss = usage.ru_maxrss
+        if sys.platform == 'darwin':
+            maxrss = maxrss/1024
+        record.update({ 'user': usage.ru_utime,
+                        'sys': usage.ru_stime,
+                        'maxrss_kb': maxrss,
+                        'write_bytes': usage.ru_oublock*512 })
+    return record
+    
+def save_report(filename, test_suite, result):
+    """
+    Writes a json report with the outcome, the wall time and the cost of 
+    every fehm run of each test-case in a suite.
+    
+    :param filename: Name of the report file.
+    :type filename: str
+    
+    :param test_suite: Suite of fehmTest test-cases that has been run.
+    :type test_suite: unittest.TestSuite
+    
+    :param result: Result of running test_suite.
+    :type result: unittest.TestResult
+    """
+    
+    failures = [id(test) for test, tb in result.failures]
+    errors = [id(test) for test, tb in result.errors]
+    report = {}
+    for test in test_suite:
+        if id(test) in errors:
+            status = 'ERROR'
+        elif id(test) in failures:
+            status = 'FAIL'
+        else:
+            status = 'ok'
+        report[test._testMethodName] = { 'status': status,
+                                         'elapsed': test.elapsed,
+                                         'runs': test.runs }
+    with open(filename, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+        
+def _tail(filename, nbytes=65536):
+    """
+    Reads the end of a file without reading the rest of it.
+    
+    :param filename: path of the file
+    :type filename: str
+    
+    :param nbytes: maximum number of bytes to read
+    :type nbytes: int
+    
+    :returns: the last nbytes of the file
+    """
+    
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell()-nbytes))
+        return f.read()
+        
+def _reverse_lines(filename, blocksize=65536):
+    """
+    Yields the lines of a file from last to first, reading the file backwards
+    one block at a time.
+    
+    :param filename: path of the file
+    :type filename: str
+    
+    :param blocksize: number of bytes read per seek
+    :type blocksize: int
+    """
+    
+    with open(filename, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        head = ''
+        while pos > 0:
+            size = min(blocksize, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size)+head).split('\n')
+            #The first line may continue in the previous block.
+            head = lines.pop(0)
+            for line in reversed(lines):
+                yield line
+        yield head
+
+def _last_timestep(outfile):
+    """
+    Finds the last time step written to a fehm output file, reading only the
+    end of the file.
+    
+    :param outfile: path of the fehm output file
+    :type outfile: str
+    
+    :returns: tuple of the time step number and the simulated time in days 
+              as written by fehm, or None if no time step was written.
+    """
+    
+    #Lines following the current one, nearest first.
+    following = []
+    for line in _reverse_lines(outfile):
+        if line.split()[:2] == ['Time', 'Step']:
+            #Timing Information: Years, Days, Step Size (Days)
+            for l in following:
+                values = l.split()
+                if len(values) == 3 and 'Years' not in l:
+                    return int(line.split()[2]), values[1]
+            return int(line.split()[2]), '?'
+        following = [line]+following[:4]
+    return None
+    
+#Digests of files hashed by the run cache, keyed by path, size and mtime.
+_digests = {}
+
+def _file_digest(path):
+    """
+    Returns the sha1 hex digest of the contents of a file, reusing the digest
+    of an unchanged file.
+    
+    :param path: path of the file
+    :type path: str
+    """
+    
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    if key not in _digests:
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        _digests[key] = sha.hexdigest()
+    return _digests[key]
                      
 def cleanup():
     """ 
@@ -1019,58 +1712,458 @@ def cleanup():
     dirs = glob.glob(os.path.join('*','*_output'))
     for d in dirs: shutil.rmtree( d )
                   
-def suite(mode, test_case, log):
+#Test-cases shared with the worker processes of run_parallel().
+_pool_tests = []
+
+def _run_pooled(index):
+    """
+    Runs a single test-case of the pooled suite inside a worker process.
+    
+    The test-case is inherited from the parent process through fork, so only
+    its index is sent to the worker. The outcome is returned as plain strings
+    since unittest results and tracebacks cannot be pickled.
+    
+    :param index: Position of the test-case in _pool_tests.
+    :type index: int
+    """
+    
+    test = _pool_tests[index]
+    stream = StringIO()
+    runner = unittest.TextTestRunner(stream=stream, verbosity=0)
+    start = time.time()
+    result = runner.run(test)
+    elapsed = time.time() - start
+    
+    #Worker processes exit without flushing open files.
+    if test.log:
+        test.fail_log.flush()
+    
+    if result.errors:
+        status = 'ERROR'
+    elif result.failures:
+        status = 'FAIL'
+    else:
+        status = 'ok'
+        
+    return { 'index': index,
+             'status': status,
+             'time': elapsed,
+             'subcase_times': test.subcase_times,
+             'runs': test.runs,
+             'failures': [tb for t, tb in result.failures],
+             'errors': [tb for t, tb in result.errors] }
+             
+def _input_size(test):
+    """
+    Returns the number of bytes in the input folder of a test-case, used to 
+    rank test-cases without recorded wall times.
+    """
+    
+    return _folder_size(os.path.join(test.maindir, test._testMethodName, 
+                                     'input'))
+    
+def _folder_size(folder):
+    """
+    Returns the number of bytes in the files below a folder.
+    """
+    
+    size = 0
+    for root, dirs, files in os.walk(folder):
+        for filename in files:
+            size += os.path.getsize(os.path.join(root, filename))
+    return size
+    
+def schedule(tests, jobs):
+    """
+    Orders test-cases longest first (LPT scheduling) using the wall times in
+    fehmTest.runtimes, and predicts the makespan on jobs workers.
+    
+    Test-cases without a recorded time are placed first, largest input folder
+    first, since nothing is known about how long they take.
+    
+    :param tests: fehmTest test-cases.
+    :type tests: list
+    
+    :param jobs: Number of workers.
+    :type jobs: int
+    
+    :returns: ordered list of test indices and the predicted makespan in 
+              seconds of the test-cases with recorded times.
+    """
+    
+    def cost(i):
+        predicted = fehmTest.runtimes.get(tests[i]._testMethodName)
+        if predicted is None:
+            return (1, _input_size(tests[i]))
+        return (0, predicted)
+    order = sorted(range(len(tests)), key=cost, reverse=True)
+    
+    #Greedy assignment to the least loaded worker, as the pool will do.
+    loads = [0.]*max(jobs, 1)
+    for i in order:
+        predicted = fehmTest.runtimes.get(tests[i]._testMethodName, 0.)
+        loads[loads.index(min(loads))] += predicted
+    return order, max(loads)
+    
+def load_runtimes(filename):
+    """
+    Reads recorded wall times from a json file.
+    
+    :param filename: Name of the runtimes file.
+    :type filename: str
+    
+    :returns: dict of wall times, empty if the file does not exist.
+    """
+    
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, 'r') as f:
+        return json.load(f)
+        
+def save_runtimes(filename, test_suite, result):
+    """
+    Merges the wall times measured for the test-cases of a suite and their
+    subcases into a json runtimes file.
+    
+    Only test-cases that passed without restoring any fehm run from the run
+    cache update their time, since failed, killed and cached runs say little
+    about how long a test-case takes. Other test-cases keep their earlier 
+    time.
+    
+    :param filename: Name of the runtimes file.
+    :type filename: str
+    
+    :param test_suite: Suite of fehmTest test-cases that has been run.
+    :type test_suite: unittest.TestSuite
+    
+    :param result: Result of running test_suite.
+    :type result: unittest.TestResult
+    """
+    
+    failed = set(id(test) for test, tb in result.failures+result.errors)
+    runtimes = load_runtimes(filename)
+    for test in test_suite:
+        cached = [r for r in test.runs if r['cached']]
+        if test.elapsed is not None and id(test) not in failed and not cached:
+            runtimes[test._testMethodName] = test.elapsed
+        runtimes.update(test.subcase_times)
+    with open(filename, 'w') as f:
+        json.dump(runtimes, f, indent=1, sort_keys=True)
+             
+def _predicted(test):
+    """
+    Describes the recorded wall time of a test-case for the reports.
+    """
+    
+    predicted = fehmTest.runtimes.get(test._testMethodName)
+    if predicted is None:
+        return 'no recorded time'
+    return 'predicted %.1fs' % predicted
+    
+def report_runtimes(test_suite, stream=sys.stderr):
+    """
+    Writes the actual and the predicted wall time of each test-case of a suite
+    run serially, and their predicted total, as run_parallel() reports them.
+    
+    :param test_suite: Suite of fehmTest test-cases that has been run.
+    :type test_suite: unittest.TestSuite
+    
+    :param stream: Stream to write to.
+    :type stream: file
+    """
+    
+    tests = list(test_suite)
+    order, makespan = schedule(tests, 1)
+    stream.write('\nWall times:\n')
+    for test in tests:
+        if test.elapsed is not None:
+            stream.write('%s (%.1fs, %s)\n' % 
+                         (test._testMethodName, test.elapsed, _predicted(test)))
+    stream.write('Predicted %.3fs for test-cases with recorded times\n' % 
+                 makespan)
+             
+def run_parallel(test_suite, jobs, threads=False):
+    """
+    Runs the test-cases of a suite concurrently on a pool of workers and 
+    merges their outcomes into a single report.
+    
+    Every test-case writes its simulation output to its own test-case folder,
+    so test-cases never share a run directory. The report has the same layout
+    as the one produced by unittest.TextTestRunner, with the actual and the 
+    predicted wall time of each test-case added. Test-cases are handed to the
+    workers longest first, see schedule().
+    
+    :param test_suite: Suite of fehmTest test-cases.
+    :type test_suite: unittest.TestSuite
+    
+    :param jobs: Number of workers.
+    :type jobs: int
+    
+    :param threads: Use worker threads instead of worker processes. The 
+                    harness never changes directory, so threads are safe and
+                    avoid the cost of forking.
+    :type threads: bool
+    """
+    
+    global _pool_tests
+    _pool_tests = list(test_suite)
+    
+    stream = unittest.runner._WritelnDecorator(sys.stderr)
+    result = unittest.TextTestResult(stream, True, 2)
+    
+    order, makespan = schedule(_pool_tests, jobs)
+    
+    start = time.time()
+    if threads:
+        pool = ThreadPool(min(jobs, max(len(_pool_tests), 1)))
+    else:
+        pool = multiprocessing.Pool(min(jobs, max(len(_pool_tests), 1)))
+    try:
+        for outcome in pool.imap_unordered(_run_pooled, order, 1):
+            test = _pool_tests[outcome['index']]
+            test.elapsed = outcome['time']
+            test.subcase_times = outcome['subcase_times']
+            test.runs = outcome['runs']
+            result.testsRun += 1
+            for tb in outcome['failures']:
+                result.failures.append((test, tb))
+            for tb in outcome['errors']:
+                result.errors.append((test, tb))
+            stream.writeln('%s ... %s (%.1fs, %s)' % 
+                (result.getDescription(test), outcome['status'], 
+                 outcome['time'], _predicted(test)))
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+    
+    #Summarize in the same format as unittest.TextTestRunner.
+    result.printErrors()
+    stream.writeln(result.separator2)
+    stream.writeln('Ran %d test%s in %.3fs with %d workers' % 
+        (result.testsRun, result.testsRun != 1 and 's' or '', elapsed, jobs))
+    stream.writeln('Predicted %.3fs for test-cases with recorded times' % 
+        makespan)
+    stream.writeln()
+    if result.wasSuccessful():
+        stream.writeln('OK')
+    else:
+        stream.writeln('FAILED (failures=%d, errors=%d)' % 
+            (len(result.failures), len(result.errors)))
+    
+    return result
+                  
+#Test-cases of the admin suite.
+admin_tests = [
+    'saltvcon',
+    'dissolution',
+    'salt_perm_poro',
+    'avdonin',
+    'boun',
+    'cden',
+    'doe',
+    'head',
+    'ramey',
+    'theis',
+    'dryout',
+    'multi_solute',
+    'sorption',
+    'baro_vel',
+    'cellbased',
+    'heat_pipe',
+    'toronyi',
+    'colloid_filtration',
+    'mptr',
+    'bodyforce',
+    'richards',
+    'rad_decay',
+    'ppor_read',
+    
+    #Works with FEHM V3.2
+    #'heatflux_1DConvection',
+    
+    #TODO - Look into why this test takes so long.
+    #'evaporation',
+    
+    #TODO - Figure out how to read some other formats.
+    #'sptr_btc',
+    #'sorption',
+    #'particle_capture',
+    #'mptr',
+    #'lost_part',
+    #'chain',
+    #'co2test',
+    #'convection',
+    #'dpdp_rich',
+    #'erosion',
+    #'gdpm',
+    #'forward',
+    ]
+    
+#Four letter keywords of fehm input macros, used to tell which functionality
+#a test-case exercises.
+fehm_macros = set([
+    'adif', 'airw', 'anpe', 'boun', 'bous', 'carb', 'cden', 'cgdp', 'chea', 
+    'cond', 'conn', 'cont', 'conv', 'coor', 'ctrl', 'dpdp', 'dual', 'dvel', 
+    'elem', 'eos ', 'evap', 'exrl', 'fdm ', 'finv', 'flo2', 'flo3', 'floa', 
+    'flgh', 'flow', 'flxn', 'flxo', 'flxz', 'fper', 'frlp', 'ftsc', 'gdkm', 
+    'gdpm', 'grad', 'hcon', 'head', 'hflx', 'hist', 'hyco', 'ice ', 'imex', 
+    'impf', 'init', 'isot', 'iter', 'itfc', 'ivfc', 'mdno', 'mptr', 'nfin', 
+    'ngas', 'nobr', 'node', 'nrst', 'para', 'pcns', 'perm', 'perp', 'pest', 
+    'phys', 'ppor', 'pres', 'ptrk', 'renu', 'rest', 'rflx', 'rich', 'rive', 
+    'rlp ', 'rlpm', 'rock', 'rxn ', 'sice', 'sol ', 'sptr', 'stea', 'strs', 
+    'subm', 'svar', 'szna', 'thic', 'time', 'trac', 'trxn', 'user', 'vapl', 
+    'vbou', 'vcon', 'velo', 'weli', 'well', 'wflo', 'wgtu', 'wtsi', 'zeol', 
+    'zone', 'zonn'])
+
+def test_features(testdir):
+    """
+    Collects the functionality a test-case exercises: the types of its 
+    comparison files ('output:avs', 'output:his', ...) and the macros used in
+    the input decks named by its control files ('macro:boun', ...).
+    
+    :param testdir: Path of the test-case folder.
+    :type testdir: str
+    
+    :returns: set of feature strings
+    """
+    
+    features = set()
+    for filename in glob.glob(os.path.join(testdir, 'compare', '*')):
+        features.add('output:'+filename.split('.')[-1])
+        
+    #Input decks are named by the 'input' key, or on the first line of old
+    #style control files, relative to the subcase run directory.
+    rundir = os.path.join(testdir, '_output')
+    decks = set()
+    for filesfile in glob.glob(os.path.join(testdir,'input','control','*.files')):
+        with open(filesfile, 'r') as f:
+            lines = f.readlines()
+        for line in lines[:1]+[l for l in lines if l.startswith('input')]:
+            deck = os.path.normpath(os.path.join(rundir, line.split(':')[-1].strip()))
+            if os.path.isfile(deck):
+                decks.add(deck)
+    #Decks written at run time are generated from templates in input.
+    if len(decks) == 0:
+        decks.update(glob.glob(os.path.join(testdir, 'input', '*.tpl')))
+        
+    for deck in decks:
+        with open(deck, 'r') as f:
+            for line in f:
+                key = (line.rstrip()+'    ')[:4].lower()
+                if key in fehm_macros:
+                    features.add('macro:'+key.strip())
+    return features
+    
+def select_tests(tests, budget, maindir):
+    """
+    Selects a subset of test-cases that fits a time budget while covering as
+    many distinct macros and output types as possible.
+    
+    Test-cases are picked greedily by the number of features they add per 
+    second of recorded wall time (fehmTest.runtimes) until no test-case adds 
+    a feature within the remaining budget. 
+    
+    Test-cases without a recorded time are estimated from the size of their
+    input folder at the median rate in seconds per byte of the recorded 
+    test-cases. A recorded time below a tenth of that estimate is taken to 
+    come from a run that did not simulate everything and is replaced by the 
+    estimate. Without any recorded time the test-case with the median input
+    size is assumed to take a second, so smaller test-cases are still 
+    preferred.
+    
+    :param tests: Names of the candidate test-cases.
+    :type tests: list
+    
+    :param budget: Time budget in seconds.
+    :type budget: float
+    
+    :param maindir: Folder containing the test-case folders.
+    :type maindir: str
+    
+    :returns: selected test names in selection order and their predicted
+              total wall time in seconds.
+    """
+    
+    sizes = dict((t, _folder_size(os.path.join(maindir, t, 'input'))) 
+                 for t in tests)
+    rates = sorted(fehmTest.runtimes[t]/sizes[t] for t in tests 
+                   if t in fehmTest.runtimes and sizes[t] > 0)
+    if len(rates) == 0:
+        nonzero = sorted(size for size in sizes.values() if size > 0)
+        rates = [1./nonzero[len(nonzero)//2]] if nonzero else []
+    rate = rates[len(rates)//2] if rates else None
+    costs = {}
+    for t in tests:
+        estimate = rate*sizes[t] if rate is not None and sizes[t] > 0 else 1.
+        cost = fehmTest.runtimes.get(t)
+        if cost is None or cost < 0.1*estimate:
+            cost = estimate
+        costs[t] = max(cost, 1.e-3)
+    features = dict((t, test_features(os.path.join(maindir, t))) 
+                    for t in tests)
+    
+    selected = []
+    covered = set()
+    total = 0.
+    while True:
+        best = None
+        for t in tests:
+            if t in selected or total+costs[t] > budget:
+                continue
+            score = len(features[t]-covered)/costs[t]
+            if score > 0 and (best is None or score > best[0]):
+                best = (score, t)
+        if best is None:
+            break
+        selected.append(best[1])
+        covered |= features[best[1]]
+        total += costs[best[1]]
+    return selected, total
+    
+def parse_budget(budget):
+    """
+    Converts a time budget such as '90', '60s', '5m' or '1h' to seconds.
+    
+    Raises argparse.ArgumentTypeError for anything else, so the command line 
+    parser reports it.
+    """
+    
+    units = {'s': 1., 'm': 60., 'h': 3600.}
+    text = budget.strip()
+    scale = 1.
+    if text[-1:] in units:
+        text, scale = text[:-1], units[text[-1]]
+    try:
+        seconds = float(text)*scale
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid budget '%s', use e.g. "
+                                         "90s, 5m or 1h" % budget)
+    if not seconds > 0:
+        raise argparse.ArgumentTypeError("budget '%s' is not positive" % 
+                                         budget)
+    return seconds
+                  
+def suite(mode, test_case, log, budget=120.):
     suite = unittest.TestSuite()
     
     #Default mode is admin for now. Should it be different?
     if mode == 'admin' or mode == 'default':
-        suite.addTest(fehmTest('saltvcon', log))
-        suite.addTest(fehmTest('dissolution', log))
-        suite.addTest(fehmTest('salt_perm_poro', log))
-        suite.addTest(fehmTest('avdonin', log))
-        suite.addTest(fehmTest('boun', log))
-        suite.addTest(fehmTest('cden', log))
-        suite.addTest(fehmTest('doe', log))       
-        suite.addTest(fehmTest('head', log))
-        suite.addTest(fehmTest('ramey', log))
-        suite.addTest(fehmTest('theis', log))
-        suite.addTest(fehmTest('dryout', log))
-        suite.addTest(fehmTest('multi_solute', log))
-        suite.addTest(fehmTest('sorption', log))
-        suite.addTest(fehmTest('baro_vel', log))
-        suite.addTest(fehmTest('cellbased', log))
-        suite.addTest(fehmTest('heat_pipe', log))
-        suite.addTest(fehmTest('toronyi', log))
-        suite.addTest(fehmTest('colloid_filtration', log))
-        suite.addTest(fehmTest('mptr', log))
-        suite.addTest(fehmTest('bodyforce', log))
-        suite.addTest(fehmTest('richards', log))
-        suite.addTest(fehmTest('rad_decay', log))
-        suite.addTest(fehmTest('ppor_read', log))
-        
-        #Works with FEHM V3.2
-        #suite.addTest(fehmTest('heatflux_1DConvection', log))
-        
-        #TODO - Look into why this test takes so long.
-        #suite.addTest(fehmTest('evaporation', log))
-        
-        #TODO - Figure out how to read some other formats.
-        #suite.addTest(fehmTest('sptr_btc', log))
-        #suite.addTest(fehmTest('sorption', log))
-        #suite.addTest(fehmTest('particle_capture', log))
-        #suite.addTest(fehmTest('mptr', log))
-        #suite.addTest(fehmTest('lost_part', log))
-        #suite.addTest(fehmTest('chain', log))
-        #suite.addTest(fehmTest('co2test', log))
-        #suite.addTest(fehmTest('convection', log))
-        #suite.addTest(fehmTest('dpdp_rich', log))
-        #suite.addTest(fehmTest('erosion', log))
-        #suite.addTest(fehmTest('gdpm', log))
-        #suite.addTest(fehmTest('forward', log))
+        for name in admin_tests:
+            suite.addTest(fehmTest(name, log))
     
     elif mode == 'developer':
-        #This mode will be a reduced set that runs faster.
-        pass
+        #Reduced set that runs faster and still covers most functionality.
+        maindir = os.getcwd()
+        if not any(name in fehmTest.runtimes for name in admin_tests):
+            sys.stderr.write('No recorded wall times, estimating test-cases '
+                             'from their input size. Run the admin suite once '
+                             'to record them.\n')
+        names, total = select_tests(admin_tests, budget, maindir)
+        sys.stderr.write('Developer suite (predicted %.1fs of %.1fs): %s\n' % 
+                         (total, budget, ', '.join(names)))
+        for name in names:
+            suite.addTest(fehmTest(name, log))
              
     elif mode == 'solo':
         suite.addTest(fehmTest(test_case, log))
@@ -1101,6 +2194,33 @@ if __name__ == '__main__':
     parser.add_argument('-l', '--log', help=h, action=a)
     h = "Clean up fehm output files"
     parser.add_argument( '--clean', help=h, action=a)
+    h = 'Number of test-cases to run concurrently.'
+    parser.add_argument('-j', '--jobs', help=h, type=int, default=1)
+    h = 'Number of subcases of a test-case to simulate concurrently.'
+    parser.add_argument('--subcase-jobs', help=h, type=int, default=1)
+    h = 'Number of processes parsing the contour files of a subcase.'
+    parser.add_argument('--read-jobs', help=h, type=int, default=1)
+    h = 'Run concurrent test-cases in threads instead of processes.'
+    parser.add_argument('--threads', help=h, action=a)
+    h = "Seconds after which a fehm simulation is killed"
+    parser.add_argument('--timeout', help=h, type=float, default=None)
+    h = "Time budget of developer mode, e.g. 90s, 5m or 1h"
+    parser.add_argument('--budget', help=h, type=parse_budget, default='120s')
+    h = "File of recorded test-case wall times used to schedule test-cases"
+    parser.add_argument('--runtimes', help=h, default='_runtimes.json')
+    h = "Write the outcome and resource usage of every fehm run to a json file"
+    parser.add_argument('--report', help=h, default=None)
+    h = "Benchmark mode: run each fehm simulation N times and fail on slowdowns"
+    parser.add_argument('--benchmark', help=h, type=int, default=0, metavar='N')
+    h = "Fractional slowdown versus the benchmark baseline that fails a test"
+    parser.add_argument('--threshold', help=h, type=float, default=0.1)
+    h = "Reuse the outputs of earlier fehm runs with unchanged inputs, cached in '_runcache'"
+    parser.add_argument('--cache', help=h, action=a)
+    h = "Parse the comparison files on every run instead of keeping them in '_baselines'"
+    parser.add_argument('--no-baseline-cache', help=h, action=a)
+    h = "Stop comparing at the first failure or report every failed comparison"
+    parser.add_argument('--policy', help=h, default='fail-fast',
+                        choices=['fail-fast', 'collect-all'])
     #Positional Arguments
     h = 'Path to the FEHM executable.'
     parser.add_argument('exe', help=h)
@@ -1145,10 +2265,38 @@ if __name__ == '__main__':
     if args['log']:
         log = True
     
+    fehmTest.subcase_jobs = args['subcase_jobs']
+    fehmTest.read_jobs = args['read_jobs']
+    fehmTest.timeout = args['timeout']
+    fehmTest.policy = args['policy']
+    fehmTest.benchmark = args['benchmark']
+    fehmTest.benchmark_threshold = args['threshold']
+    fehmTest.benchmark_db = os.path.abspath('_benchmarks.db')
+    fehmTest.runtimes = load_runtimes(args['runtimes'])
+    if args['cache']:
+        fehmTest.run_cache = os.path.abspath('_runcache')
+        if not os.path.exists(fehmTest.run_cache):
+            os.mkdir(fehmTest.run_cache)
+    if not args['no_baseline_cache']:
+        fehmTest.baseline_cache = os.path.abspath('_baselines')
+        if not os.path.exists(fehmTest.baseline_cache):
+            os.mkdir(fehmTest.baseline_cache)
+    
     #Run the test suite.    
-    runner = unittest.TextTestRunner(verbosity=2)
-    test_suite = suite(mode, test_case, log)
-    runner.run(test_suite)
+    test_suite = suite(mode, test_case, log, args['budget'])
+    if args['jobs'] > 1:
+        result = run_parallel(test_suite, args['jobs'], args['threads'])
+    else:
+        runner = unittest.TextTestRunner(verbosity=2)
+        result = runner.run(test_suite)
+        report_runtimes(test_suite)
+    #Runs sharing oversubscribed cores or repeated for benchmarking take 
+    #longer than a test-case does on its own, so they keep the recorded times.
+    workers = args['jobs']*args['subcase_jobs']
+    if workers <= multiprocessing.cpu_count() and args['benchmark'] == 0:
+        save_runtimes(args['runtimes'], test_suite, result)
+    if args['report'] is not None:
+        save_report(args['report'], test_suite, result)
     
 
 
@@ -0,0 +1,172 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Array kernels used by fehmpytests to reduce the difference between new and
+old FEHM output into the quantities that are tested against a tolerance.
+"""
+import numpy as np
+
+measures = ('max_difference', 'rms_difference', 'perc_difference')
+
+def stack(rows):
+    """
+    Stacks rows of possibly different lengths into a 2D float array.
+
+    Returns the array and a boolean array of the same shape that is False
+    where a short row was padded. Padding is NaN and left out of every
+    measure; a NaN value given in a row is data and fails every measure.
+
+    :param rows: Sequence of 1D sequences of numbers, or a 2D array.
+    :type rows: list
+    """
+    if isinstance(rows, np.ndarray) and rows.ndim == 2:
+        return rows.astype(float), np.ones(rows.shape, dtype=bool)
+    rows = [np.asarray(row, dtype=float).ravel() for row in rows]
+    width = max([len(row) for row in rows]) if rows else 0
+    out = np.empty((len(rows), width))
+    out.fill(np.nan)
+    present = np.zeros((len(rows), width), dtype=bool)
+    for i, row in enumerate(rows):
+        out[i, :len(row)] = row
+        present[i, :len(row)] = True
+    return out, present
+
+def difference(dif, old, measure, axis=-1, present=None):
+    """
+    Measures differences into a single quantity along axis.
+
+    :param dif: Differences between new and old values.
+    :type dif: numpy.ndarray
+
+    :param old: Old values, same shape as dif. Only used by perc_difference.
+    :type old: numpy.ndarray
+
+    :param measure: One of 'max_difference', 'rms_difference' or
+                    'perc_difference'.
+    :type measure: str
+
+    :param axis: Axis, or tuple of axes, reduced by the measure.
+    :type axis: int
+
+    :param present: False where dif holds no value to measure, e.g. the
+                    padding of stack, None if every value is measured.
+    :type present: numpy.ndarray
+
+    Returns an array with the measure for every index left after reducing
+    axis. The rms_difference is the square root of the mean absolute
+    difference, as it has always been computed by fehmpytests. The
+    perc_difference sums the relative differences where old is nonzero and
+    divides by the number of values. A measured NaN in dif or old makes the
+    measure infinite.
+    """
+    terms, count = _terms(dif, old, measure, present)
+    if measure == 'max_difference':
+        return terms.max(axis=axis)
+    if measure == 'rms_difference':
+        return np.sqrt(terms.sum(axis=axis)/np.maximum(count.sum(axis=axis), 1))
+    return terms.sum(axis=axis)/np.maximum(count.sum(axis=axis), 1)
+
+def divergence(dif, old, measure, maxerr, present=None):
+    """
+    Returns the column where every row of differences leaves tolerance.
+
+    The measure is accumulated along the last axis, so column j holds the
+    measure of the first j+1 values of the row, and the first column where it
+    is not below maxerr is returned, or -1 where the row never leaves
+    tolerance. For the history of a node this is the first time the new run
+    drifted too far from the old one.
+
+    :param dif: 2D array of differences.
+    :type dif: numpy.ndarray
+
+    :param old: Old values, same shape as dif. Only used by perc_difference.
+    :type old: numpy.ndarray
+
+    :param measure: One of 'max_difference', 'rms_difference' or
+                    'perc_difference'.
+    :type measure: str
+
+    :param maxerr: Tolerance for the measure.
+    :type maxerr: float
+
+    :param present: False where dif holds no value to measure, None if every
+                    value is measured.
+    :type present: numpy.ndarray
+    """
+    terms, count = _terms(dif, old, measure, present)
+    if terms.shape[-1] == 0:
+        return -np.ones(terms.shape[:-1], dtype=int)
+    if measure == 'max_difference':
+        running = np.maximum.accumulate(terms, axis=-1)
+    else:
+        running = np.cumsum(terms, axis=-1)/ \
+                  np.maximum(np.cumsum(count, axis=-1), 1)
+        if measure == 'rms_difference':
+            running = np.sqrt(running)
+    out = ~(running < maxerr)
+    return np.where(out.any(axis=-1), out.argmax(axis=-1), -1)
+
+def _terms(dif, old, measure, present=None):
+    #Contribution of every value to the measure, and 1 where it is present.
+    #A present NaN contributes an infinite difference.
+    if measure not in measures:
+        raise ValueError('Unknown test measure %s.'%measure)
+    dif = np.abs(np.asarray(dif, dtype=float))
+    if present is None:
+        present = np.ones(dif.shape, dtype=bool)
+    invalid = present & np.isnan(dif)
+    if measure == 'perc_difference':
+        old = np.abs(np.asarray(old, dtype=float))
+        invalid = invalid | (present & np.isnan(old))
+        nonzero = present & ~invalid & (old != 0)
+        terms = np.zeros(dif.shape)
+        np.divide(dif, old, out=terms, where=nonzero)
+    else:
+        terms = np.where(present & ~invalid, dif, 0.)
+    terms[invalid] = np.inf
+    return terms, present.astype(int)
+
+def failures(measured, maxerr):
+    """
+    Returns the indexes of the measures that are not below maxerr.
+
+    :param measured: Measures returned by difference.
+    :type measured: numpy.ndarray
+
+    :param maxerr: Tolerance for the measures.
+    :type maxerr: float
+    """
+    #A NaN measure compares as failing, just like the scalar test it replaces.
+    return np.flatnonzero(~(np.asarray(measured) < maxerr))
+
+def worst(dif, present=None):
+    """
+    Returns the column of the largest absolute difference in every row.
+
+    A NaN value counts as larger than any number, padding as smaller.
+
+    :param dif: 2D array of differences.
+    :type dif: numpy.ndarray
+
+    :param present: False where dif holds no value, e.g. the padding of
+                    stack, None if every value is present.
+    :type present: numpy.ndarray
+    """
+    dif = np.abs(np.asarray(dif, dtype=float))
+    if dif.shape[-1] == 0:
+        return np.zeros(dif.shape[:-1], dtype=int)
+    if present is None:
+        present = np.ones(dif.shape, dtype=bool)
+    dif = np.where(np.isnan(dif), np.inf, dif)
+    return np.where(present, dif, -1.).argmax(axis=-1)
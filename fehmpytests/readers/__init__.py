@@ -0,0 +1,25 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Readers for the contour (AVS and CSV), history, tracer, output and particle
+tracking files written by FEHM.
+"""
+from contour import fcontour
+from history import fhistory, ftracer
+from output import foutput
+from ptrack import fptrk
+from diff import fdiff, contour_diffs, history_diffs
+
+__all__ = ['fcontour', 'fhistory', 'ftracer', 'foutput', 'fptrk', 'fdiff',
+           'contour_diffs', 'history_diffs']
@@ -0,0 +1,289 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+import glob
+import multiprocessing
+import os
+import numpy as np
+from parse import block, contour_time, mapped
+import store
+
+#Short names for the contour variables written by FEHM. Names not listed
+#here are used as they appear in the file.
+names = {
+    'X coordinate (m)': 'x',
+    'Y coordinate (m)': 'y',
+    'Z coordinate (m)': 'z',
+    'Liquid Pressure (MPa)': 'P',
+    'Vapor Pressure (MPa)': 'P_vap',
+    'Capillary Pressure (MPa)': 'P_cap',
+    'Saturation': 'saturation',
+    'Temperature (deg C)': 'T',
+    'Porosity': 'n',
+    'X Permeability (log m**2)': 'perm_x',
+    'Y Permeability (log m**2)': 'perm_y',
+    'Z Permeability (log m**2)': 'perm_z',
+    'X displacement (m)': 'disp_x',
+    'Y displacement (m)': 'disp_y',
+    'Z displacement (m)': 'disp_z',
+    'X stress (MPa)': 'strs_xx',
+    'Y stress (MPa)': 'strs_yy',
+    'Z stress (MPa)': 'strs_zz',
+    'XY stress (MPa)': 'strs_xy',
+    'XZ stress (MPa)': 'strs_xz',
+    'YZ stress (MPa)': 'strs_yz',
+    'Liquid Density (kg/m**3)': 'density',
+    'Vapor Density (kg/m**3)': 'density_vap',
+    'Liquid Volume Flux (m3/[m2 s])': 'flux',
+    'Vapor Volume Flux (m3/[m2 s])': 'flux_vap',
+}
+
+def variable_name(name):
+    """
+    Returns the short name of a contour variable.
+
+    :param name: The variable name as written in the file header.
+    :type name: str
+    """
+    name = ' '.join(name.split())
+    return _names.get(name.lower(), name)
+
+_names = dict((key.lower(), value) for key, value in names.items())
+
+def read_avs(filename):
+    """
+    Reads an AVS node file.
+
+    Returns the node numbers and a dict of the variable columns. The file is
+    memory-mapped and its rows are converted in a single pass straight from
+    the map, without reading them into a string.
+
+    :param filename: Name of the AVS file.
+    :type filename: str
+    """
+    with open(filename, 'rb') as f:
+        text = mapped(f)
+        try:
+            counts = [int(c) for c in text.readline().split()]
+            sizes = counts[1:counts[0]+1]
+            header = [text.readline().split(',')[0] for size in sizes]
+            values = block(text, 1+sum(sizes), text.tell())
+        finally:
+            text.close()
+    columns = np.ascontiguousarray(values.T)
+    variables = {}
+    col = 1
+    for name, size in zip(header, sizes):
+        name = variable_name(name)
+        if size == 1:
+            variables[name] = columns[col]
+        else:
+            for i in range(size):
+                variables[name+'_'+'xyz'[i]] = columns[col+i]
+        col += size
+    return columns[0].astype(int), variables
+
+def read_csv(filename):
+    """
+    Reads a CSV node file.
+
+    Returns the node numbers and a dict of the variable columns. The file is
+    read whole into one buffer, its commas are blanked in place and its rows
+    are converted in a single pass.
+
+    :param filename: Name of the CSV file.
+    :type filename: str
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError('%s is empty.'%filename)
+        header = [name.strip() for name in f.readline().split(',')]
+        text = bytearray(os.fstat(f.fileno()).st_size-f.tell())
+        f.readinto(text)
+    chars = np.frombuffer(text, np.uint8)
+    chars[chars == ord(',')] = ord(' ')
+    values = block(text, len(header))
+    columns = np.ascontiguousarray(values.T)
+    variables = {}
+    for i, name in enumerate(header[1:]):
+        variables[variable_name(name)] = columns[i+1]
+    return columns[0].astype(int), variables
+
+def contour_files(filename):
+    """
+    Returns the contour files matching filename grouped by time step.
+
+    A sorted list of (time, files) is returned. Several files share a time
+    step when FEHM writes e.g. scalar and vector output.
+
+    :param filename: File name or glob pattern of the contour files.
+    :type filename: str
+    """
+    steps = {}
+    for name in sorted(glob.glob(filename)):
+        #Geometry files do not hold node data.
+        if name.endswith('_geo.avs'):
+            continue
+        time = contour_time(os.path.basename(name))
+        if time is not None:
+            steps.setdefault(time, []).append(name)
+    return sorted(steps.items())
+
+def read_step(files, cache=None):
+    """
+    Reads the contour files of one time step.
+
+    Returns the node numbers and a dict of the variable columns.
+
+    :param files: Names of the contour files of the time step.
+    :type files: list[str]
+
+    :param cache: Directory of the binary store of parsed files, None to
+                  parse every file.
+    :type cache: str
+    """
+    nodes = np.array([], dtype=int)
+    variables = {}
+    for name in files:
+        reader = read_csv if name.endswith('.csv') else read_avs
+        nodes, values = store.load(reader, name, cache)
+        variables.update(values)
+    return nodes, variables
+
+def read_steps(steps, cache=None, jobs=1, pool=None):
+    """
+    Reads the contour files of several time steps.
+
+    Yields the time, node numbers and dict of variable columns of every time
+    step, in the order of steps. With jobs > 1 the steps are parsed by a pool
+    of processes, jobs steps at a time, while the previous steps are used, so
+    up to twice jobs steps are held in memory. Steps are parsed one after the
+    other inside daemonic processes, e.g. the workers of a parallel test run,
+    which cannot start a pool.
+
+    :param steps: Sequence of (time, files) as returned by contour_files.
+    :type steps: list
+
+    :param cache: Directory of the binary store of parsed files, None to
+                  parse every file.
+    :type cache: str
+
+    :param jobs: Number of steps parsed at a time.
+    :type jobs: int
+
+    :param pool: Pool of processes shared with other readers, see
+                 step_pool, None to start a pool of jobs processes.
+    :type pool: multiprocessing.Pool
+    """
+    steps = list(steps)
+    own = pool is None
+    if own and len(steps) > 1:
+        pool = step_pool(min(jobs, len(steps)))
+    if pool is None or jobs <= 1 or len(steps) <= 1:
+        for time, files in steps:
+            nodes, variables = read_step(files, cache)
+            yield time, nodes, variables
+        return
+    try:
+        chunks = [steps[i:i+jobs] for i in range(0, len(steps), jobs)]
+        submit = lambda chunk: pool.map_async(_read_step, 
+                                   [(files, cache) for time, files in chunk])
+        pending = submit(chunks[0])
+        for i, chunk in enumerate(chunks):
+            results = pending.get()
+            if i+1 < len(chunks):
+                pending = submit(chunks[i+1])
+            for (time, files), (nodes, variables) in zip(chunk, results):
+                yield time, nodes, variables
+    finally:
+        if own:
+            pool.terminate()
+            pool.join()
+
+def step_pool(jobs):
+    """
+    Returns a pool of jobs processes for read_steps, or None where steps are
+    parsed one after the other: for jobs <= 1 and inside daemonic processes.
+
+    :param jobs: Number of processes.
+    :type jobs: int
+    """
+    if jobs <= 1 or multiprocessing.current_process().daemon:
+        return None
+    return multiprocessing.Pool(jobs)
+
+def _read_step(args):
+    #Pool workers take a single argument.
+    return read_step(*args)
+
+class fcontour(object):
+    """
+    Contour output of a FEHM simulation.
+
+    Reads every AVS or CSV node file matching filename. Indexing by time
+    gives a dict of variable name to array of values, one per node.
+
+    :param filename: File name or glob pattern of the contour files.
+    :type filename: str
+
+    :param cache: Directory of the binary store of parsed files, None to
+                  parse every file.
+    :type cache: str
+
+    :param jobs: Number of processes parsing files, see read_steps.
+    :type jobs: int
+    """
+    def __init__(self, filename=None, cache=None, jobs=1):
+        self.filename = filename
+        self.cache = cache
+        self.nodes = np.array([], dtype=int)
+        self._nodes = {}
+        self._data = {}
+        if filename is not None:
+            steps = read_steps(contour_files(filename), cache, jobs)
+            for time, nodes, variables in steps:
+                self._add(time, nodes, variables)
+
+    def _add(self, time, nodes, variables):
+        self.nodes = nodes
+        self._nodes[time] = nodes
+        self._data[time] = variables
+
+    def __getitem__(self, time):
+        return self._data[time]
+
+    def array(self, variable):
+        """
+        Returns the values of variable as a (time x node) array, with a row
+        for every time in times.
+
+        :param variable: Name of the variable.
+        :type variable: str
+        """
+        if len(self._data) == 0:
+            return np.empty((0, len(self.nodes)))
+        return np.vstack([self._data[time][variable] for time in self.times])
+
+    def __contains__(self, time):
+        return time in self._data
+
+    @property
+    def times(self):
+        return sorted(self._data)
+
+    @property
+    def variables(self):
+        variables = set()
+        for values in self._data.values():
+            variables.update(values)
+        return sorted(variables)
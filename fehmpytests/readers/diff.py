@@ -0,0 +1,216 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+import glob
+import itertools
+import numpy as np
+from contour import fcontour, contour_files, read_steps, step_pool
+from history import fhistory
+from output import foutput
+from ptrack import fptrk
+
+def fdiff(new, old):
+    """
+    Returns new minus old, of the same type as the arguments, for every
+    variable, node, time and component present in both.
+
+    History and particle tracking values of new are interpolated to the times
+    of old when the two were written at different times. Output file values
+    are compared over the blocks written in both files.
+
+    :param new: New simulation output.
+    :type new: fcontour, fhistory, ftracer, foutput or fptrk
+
+    :param old: Old simulation output of the same type.
+    :type old: fcontour, fhistory, ftracer, foutput or fptrk
+    """
+    if isinstance(old, fcontour):
+        return _contour_diff(new, old)
+    if isinstance(old, fhistory):
+        return _history_diff(new, old)
+    if isinstance(old, foutput):
+        return _output_diff(new, old)
+    if isinstance(old, fptrk):
+        return _ptrk_diff(new, old)
+    raise TypeError('Cannot take the difference of %s.'%type(old).__name__)
+
+def contour_diffs(new, old, times=None, cache=None, jobs=1):
+    """
+    Yields the time, the difference and the old values of the time steps of
+    the contour files matching both new and old, one time step at a time.
+
+    Only the files of the current time step are held in memory, so the
+    comparison of a long simulation needs no more memory than one snapshot.
+
+    :param new: File name or glob pattern of the new contour files.
+    :type new: str
+
+    :param old: File name or glob pattern of the old contour files.
+    :type old: str
+
+    :param times: Times to compare in this order, None for every common time.
+    :type times: list[float]
+
+    :param cache: Directory of the binary store for the old files.
+    :type cache: str
+
+    :param jobs: Number of processes parsing the files of new and old ahead
+                 of the comparison, shared by both. Up to twice jobs time
+                 steps of each, new and old, are then held in memory.
+    :type jobs: int
+    """
+    new_files = dict(contour_files(new))
+    old_files = dict(contour_files(old))
+    if times is None:
+        times = sorted(old_files)
+    times = [t for t in times if t in new_files and t in old_files]
+    pool = step_pool(min(jobs, len(times)))
+    try:
+        new_steps = read_steps([(t, new_files[t]) for t in times], None, jobs,
+                               pool)
+        old_steps = read_steps([(t, old_files[t]) for t in times], cache, 
+                               jobs, pool)
+        for new_step, old_step in itertools.izip(new_steps, old_steps):
+            f_new = fcontour()
+            f_new._add(*new_step)
+            f_old = fcontour()
+            f_old._add(*old_step)
+            yield old_step[0], fdiff(f_new, f_old), f_old
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+def history_diffs(new, old, kind=fhistory, cache=None):
+    """
+    Yields the variable, the difference and the old values of the history
+    files matching both new and old, one variable at a time.
+
+    Files are only read when their variable is compared, so a caller that
+    stops at the first failing variable never parses the remaining files.
+
+    :param new: File name or glob pattern of the new history files.
+    :type new: str
+
+    :param old: File name or glob pattern of the old history files.
+    :type old: str
+
+    :param kind: fhistory or ftracer.
+    :type kind: class
+
+    :param cache: Directory of the binary store for the old files.
+    :type cache: str
+    """
+    #As when reading them all, a later file of a variable replaces earlier.
+    new_files = {}
+    for name in sorted(glob.glob(new)):
+        variable = kind().variable(name)
+        if variable is not None:
+            new_files[variable] = name
+    old_files = {}
+    for name in sorted(glob.glob(old)):
+        variable = kind().variable(name)
+        if variable is not None:
+            old_files[variable] = name
+    for variable in sorted(old_files):
+        if variable not in new_files:
+            continue
+        f_old = kind(cache=cache)
+        f_old.read(old_files[variable])
+        f_new = kind()
+        f_new.read(new_files[variable])
+        yield variable, fdiff(f_new, f_old), f_old
+
+def _align(new_nodes, old_nodes):
+    #Indexes of the nodes common to new and old, in the order of old.
+    if np.array_equal(new_nodes, old_nodes):
+        return slice(None), slice(None), old_nodes
+    nodes, inew, iold = np.intersect1d(new_nodes, old_nodes,
+                                       assume_unique=True,
+                                       return_indices=True)
+    order = np.argsort(iold)
+    return inew[order], iold[order], nodes[order]
+
+def _interp(times, new_times, new_values):
+    #Values of new at times, new_values is a (row x time) array.
+    if np.array_equal(times, new_times):
+        return new_values
+    out = np.empty((new_values.shape[0], len(times)))
+    if len(new_times) == 0:
+        out.fill(np.nan)
+        return out
+    for i, row in enumerate(new_values):
+        out[i] = np.interp(times, new_times, row)
+    return out
+
+def _contour_diff(new, old):
+    dif = type(old)()
+    for time in old.times:
+        if time not in new:
+            continue
+        inew, iold, nodes = _align(new._nodes[time], old._nodes[time])
+        values = {}
+        for variable in old[time]:
+            if variable in new[time]:
+                values[variable] = \
+                    new[time][variable][inew] - old[time][variable][iold]
+        if len(values) > 0:
+            dif._data[time] = values
+            dif._nodes[time] = nodes
+            dif.nodes = nodes
+    return dif
+
+def _history_diff(new, old):
+    dif = type(old)()
+    for variable in old.variables:
+        if variable not in new:
+            continue
+        inew, iold, nodes = _align(new._nodes[variable], old._nodes[variable])
+        times = old._times[variable]
+        values = _interp(times, new._times[variable],
+                         new._values[variable][inew])
+        dif._add(variable, nodes, times, values-old._values[variable][iold])
+    return dif
+
+def _output_diff(new, old):
+    dif = type(old)()
+    for component in old.node:
+        if component not in new.node:
+            continue
+        nodes = {}
+        for n in old.node[component]:
+            if n not in new.node[component]:
+                continue
+            old_values = old.node[component][n]
+            new_values = new.node[component][n]
+            variables = {}
+            for variable in old_values:
+                if variable in new_values:
+                    count = min(len(old_values[variable]),
+                                len(new_values[variable]))
+                    variables[variable] = new_values[variable][:count] - \
+                                          old_values[variable][:count]
+            nodes[n] = variables
+        dif.node[component] = nodes
+    return dif
+
+def _ptrk_diff(new, old):
+    dif = type(old)()
+    dif.times = old.times
+    variables = [v for v in old.variables if v in new]
+    if len(variables) > 0:
+        values = _interp(old.times, new.times,
+                         np.array([new[v] for v in variables]))
+        for variable, row in zip(variables, values):
+            dif._data[variable] = row - old[variable]
+    return dif
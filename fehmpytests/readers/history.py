@@ -0,0 +1,199 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+import glob
+import os
+import re
+import numpy as np
+from parse import table, lookup
+import store
+
+#Short names for the history file suffixes written by FEHM. Suffixes not
+#listed here are used as the variable name.
+names = {
+    'temp': 'T',
+    'presWAT': 'P',
+    'presVAP': 'P_vap',
+    'presCAP': 'P_cap',
+    'presCO2': 'P_co2',
+    'satr': 'saturation',
+    'denWAT': 'density',
+    'denAIR': 'density_air',
+    'denCO2': 'density_co2',
+    'humd': 'humidity',
+    'enth': 'enthalpy',
+    'flow': 'flow',
+    'disx': 'disp_x',
+    'disy': 'disp_y',
+    'disz': 'disp_z',
+}
+
+def read_history(filename):
+    """
+    Reads a history or tracer file.
+
+    Returns the header line naming the variable, the node numbers, the times
+    and a (node x time) array of values, or None if the file does not hold
+    the values of a single variable, like the history index file run.his.
+
+    :param filename: Name of the history file.
+    :type filename: str
+    """
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().startswith('Time ('):
+            break
+    else:
+        return None
+    nodes = np.array([int(n) for n in re.findall(r'Node\s+(\d+)', lines[i])])
+    rows = [line for line in lines[i+1:] if line.strip()]
+    values = table(rows, 1+len(nodes))
+    return (lines[i-1].strip(), nodes, np.ascontiguousarray(values[:,0]),
+            np.ascontiguousarray(values[:,1:].T))
+
+def read_header(filename):
+    """
+    Returns the header line naming the variable of a history or tracer file,
+    reading only the lines before the values, or None for an index file.
+
+    :param filename: Name of the history file.
+    :type filename: str
+    """
+    previous = None
+    with open(filename) as f:
+        for line in f:
+            if line.strip().startswith('Time ('):
+                return previous
+            previous = line.strip()
+    return None
+
+class fhistory(object):
+    """
+    History output of a FEHM simulation.
+
+    Reads every history file matching filename. Indexing by variable gives a
+    dict of node number to array of values, one per time.
+
+    :param filename: File name or glob pattern of the history files.
+    :type filename: str
+
+    :param cache: Directory of the binary store of parsed files, None to
+                  parse every file.
+    :type cache: str
+    """
+    def __init__(self, filename=None, cache=None):
+        self.filename = filename
+        self.cache = cache
+        self._times = {}
+        self._nodes = {}
+        self._values = {}
+        self._data = {}
+        self._order = {}
+        if filename is not None:
+            for name in sorted(glob.glob(filename)):
+                self.read(name)
+
+    def read(self, filename):
+        """
+        Adds the variable of a single history file, returns its name or None
+        if the file is an index file.
+
+        :param filename: Name of the history file.
+        :type filename: str
+        """
+        history = store.load(read_history, filename, self.cache)
+        if history is None:
+            return None
+        header, nodes, times, values = history
+        variable = self._variable(filename, header)
+        self._add(variable, nodes, times, values)
+        return variable
+
+    def variable(self, filename):
+        """
+        Returns the name of the variable of a history file without reading
+        its values, None for an index file.
+
+        :param filename: Name of the history file.
+        :type filename: str
+        """
+        header = read_header(filename)
+        if header is None:
+            return None
+        return self._variable(filename, header)
+
+    def _variable(self, filename, header):
+        suffix = os.path.splitext(os.path.basename(filename))[0]
+        suffix = suffix.split('_')[-1]
+        return names.get(suffix, suffix)
+
+    def _add(self, variable, nodes, times, values):
+        self._times[variable] = times
+        self._nodes[variable] = nodes
+        self._values[variable] = values
+        self._data[variable] = dict(zip(nodes.tolist(), values))
+        self._order[variable] = np.argsort(nodes, kind='mergesort')
+
+    def select(self, variable, nodes=None):
+        """
+        Returns the nodes of variable in increasing order and the array of
+        their values, one row per node.
+
+        :param variable: Name of the variable.
+        :type variable: str
+
+        :param nodes: Nodes to select, those not written are left out. None
+                      selects every node.
+        :type nodes: list[int]
+        """
+        order = self._order[variable]
+        if nodes is not None:
+            order = order[lookup(self._nodes[variable][order], nodes)]
+        return self._nodes[variable][order], self._values[variable][order]
+
+    def __getitem__(self, variable):
+        return self._data[variable]
+
+    def __contains__(self, variable):
+        return variable in self._data
+
+    @property
+    def variables(self):
+        return sorted(self._data)
+
+    @property
+    def nodes(self):
+        nodes = set()
+        for values in self._nodes.values():
+            nodes.update(values.tolist())
+        return sorted(nodes)
+
+    @property
+    def times(self):
+        for variable in self.variables:
+            return self._times[variable]
+        return np.array([])
+
+class ftracer(fhistory):
+    """
+    Tracer history output of a FEHM simulation.
+
+    Reads every tracer file matching filename. Variables are named after the
+    species in the file header, e.g. 'Cobalt[aq]'.
+
+    :param filename: File name or glob pattern of the tracer files.
+    :type filename: str
+    """
+    def _variable(self, filename, header):
+        return re.sub(r'\s+Concentration\s*\(.*\)$', '', header)
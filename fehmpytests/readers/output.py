@@ -0,0 +1,168 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+import glob
+import re
+import numpy as np
+from parse import table, is_row, lookup
+import store
+
+#Variable names for the columns of the nodal tables, keyed by the start of
+#the table header with its whitespace collapsed. Tables not listed here use
+#the header fields, split on runs of spaces, as variable names.
+headers = [
+    ('Node P (MPa) E (MJ) L sat Temp (C)',
+        ['P', 'E', 'sat', 'T', 'sour', 'sourE']),
+    ('Node perm (m2) porosity Kx',
+        ['perm', 'n', 'Kx', 'Pwv', 'D*wv', 'ps_delta_rxn']),
+    ('Node density',
+        ['dens']),
+    ('Node Gas (MPa) Pres (MPa) Pres (MPa)',
+        ['P', 'P_cap', 'P_liq', 'sour', 'residual', 'state', 'humidity']),
+    ('Node an anl anv',
+        ['an', 'anl', 'anv', 'sour', 'sourint', 'residual']),
+]
+
+def column_names(header, ncols):
+    """
+    Returns the variable names of the ncols value columns of a nodal table.
+
+    :param header: Header line of the table, starting with 'Node'.
+    :type header: str
+
+    :param ncols: Number of value columns following the node number.
+    :type ncols: int
+    """
+    collapsed = ' '.join(header.split())
+    for start, names in headers:
+        if collapsed.startswith(start) and len(names) >= ncols:
+            return names[:ncols]
+    names = re.split(r'\s{2,}', header.strip())[1:]
+    names += ['column %d'%i for i in range(len(names)+1, ncols+1)]
+    return names[:ncols]
+
+def read_output(filename):
+    """
+    Reads the nodal information of an output file.
+
+    Returns the dict node[component][node][variable] of value arrays.
+
+    :param filename: Name of the output file.
+    :type filename: str
+    """
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    node = {}
+    component = None
+    tracer = 0
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        i += 1
+        if line.startswith('Nodal Information'):
+            component = line[line.find('(')+1:line.find(')')].lower()
+            if component == 'tracer':
+                tracer += 1
+                component = 'tracer%d'%tracer
+        elif line.startswith('Time Step'):
+            #Residual tables follow each time step header.
+            component = None
+            tracer = 0
+        elif component is not None and line.startswith('Solute output'):
+            match = re.search(r'species number\s+(\d+)', line)
+            if match:
+                component = 'tracer'+match.group(1)
+        elif component is not None and line.startswith('Node') and \
+             not line.startswith('Node1'):
+            start = i
+            while i < len(lines) and is_row(lines[i]):
+                i += 1
+            if i == start:
+                continue
+            ncols = len(lines[start].split())
+            values = table(lines[start:i], ncols)
+            names = column_names(line, ncols-1)
+            nodes = node.setdefault(component, {})
+            for n, row in zip(values[:,0].astype(int).tolist(), values):
+                variables = nodes.setdefault(n, {})
+                for name, value in zip(names, row[1:]):
+                    variables.setdefault(name, []).append(value)
+    for nodes in node.values():
+        for variables in nodes.values():
+            for name in variables:
+                variables[name] = np.array(variables[name])
+    return node
+
+class foutput(object):
+    """
+    Nodal information in the output file of a FEHM simulation.
+
+    Every 'Nodal Information' block is read. The values of a variable at a
+    node of a component are found in node[component][node][variable], one
+    per block written, where component is one of 'water', 'gas', 'tracer1',
+    'tracer2', ...
+
+    :param filename: Name or glob pattern of the output file.
+    :type filename: str
+
+    :param cache: Directory of the binary store of parsed files, None to
+                  parse every file.
+    :type cache: str
+    """
+    def __init__(self, filename=None, cache=None):
+        self.filename = filename
+        self.cache = cache
+        self.node = {}
+        self._index = {}
+        if filename is not None:
+            files = sorted(glob.glob(filename))
+            if len(files) > 0:
+                self.node = store.load(read_output, files[0], cache)
+
+    def select(self, component, nodes=None):
+        """
+        Returns the nodes of component in increasing order.
+
+        :param component: Name of the component, e.g. 'water'.
+        :type component: str
+
+        :param nodes: Nodes to select, those not written are left out. None
+                      selects every node.
+        :type nodes: list[int]
+        """
+        if component not in self._index:
+            self._index[component] = np.array(sorted(self.node[component]),
+                                               dtype=int)
+        index = self._index[component]
+        if nodes is None:
+            return index
+        return index[lookup(index, nodes)]
+
+    @property
+    def components(self):
+        return sorted(self.node)
+
+    @property
+    def nodes(self):
+        nodes = set()
+        for values in self.node.values():
+            nodes.update(values)
+        return sorted(nodes)
+
+    @property
+    def variables(self):
+        variables = set()
+        for nodes in self.node.values():
+            for values in nodes.values():
+                variables.update(values)
+        return sorted(variables)
@@ -0,0 +1,173 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Helpers shared by the FEHM output readers.
+"""
+import mmap
+import os
+import re
+import numpy as np
+
+def table(lines, ncols):
+    """
+    Parses whitespace separated numeric rows into a 2D array.
+
+    The rows are converted in a single pass by numpy. Only if that fails,
+    because of Fortran formatted numbers such as 0.1234-100 or 1.0D+00, are
+    the values converted one at a time.
+
+    :param lines: Rows of the table.
+    :type lines: list[str]
+
+    :param ncols: Number of columns in every row.
+    :type ncols: int
+    """
+    if len(lines) == 0:
+        return np.empty((0, ncols))
+    text = ' '.join(lines)
+    values = np.fromstring(text, sep=' ')
+    if values.size != len(lines)*ncols:
+        values = np.array([number(token) for token in text.split()])
+    if values.size != len(lines)*ncols:
+        raise ValueError('Expected %d columns in every row.'%ncols)
+    return values.reshape(len(lines), ncols)
+
+def block(text, ncols, start=0):
+    """
+    Parses a block of text holding whitespace separated numeric rows.
+
+    Like table, but the rows are not split into lines unless the single pass
+    conversion fails. The first column must identify the row, e.g. the node
+    number, so that a conversion stopping early is noticed. The single pass
+    reads text in place from start on, without copying it.
+
+    :param text: The rows of the table.
+    :type text: str, mmap.mmap or bytearray
+
+    :param ncols: Number of columns in every row.
+    :type ncols: int
+
+    :param start: Offset of the first row in text.
+    :type start: int
+    """
+    values = np.fromstring(buffer(text, start), sep=' ')
+    last = last_line(text, start).split()
+    if values.size == 0 and len(last) == 0:
+        return np.empty((0, ncols))
+    if values.size%ncols == 0 and values.size > 0 and \
+       number(last[0]) == values[-ncols]:
+        return values.reshape(-1, ncols)
+    lines = str(text[start:]).splitlines()
+    return table([line for line in lines if line.strip()], ncols)
+
+def last_line(text, start=0):
+    """
+    Returns the last line of text after start that is not blank, without
+    copying text.
+
+    :param text: A string, memory-mapped file or bytearray.
+    :type text: str, mmap.mmap or bytearray
+
+    :param start: Offset in text where the search stops.
+    :type start: int
+    """
+    end = len(text)
+    while end > start and not text[end-1:end].strip():
+        end -= 1
+    return str(text[max(text.rfind('\n', start, end)+1, start):end])
+
+def mapped(f):
+    """
+    Returns the read-only memory map of an open file.
+
+    :param f: The file, opened for reading.
+    :type f: file
+    """
+    if os.fstat(f.fileno()).st_size == 0:
+        raise ValueError('%s is empty.'%f.name)
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+_exponent = re.compile(r'^([-+]?[0-9.]+)([-+][0-9]+)$')
+
+def number(token):
+    """
+    Converts one number written by FEHM to a float.
+
+    Literal NaN and Inf are kept as such. Any other text that is not a
+    number, such as the asterisks Fortran writes for a field that overflowed,
+    raises a ValueError, so a corrupted value is never taken for a missing
+    one.
+
+    :param token: The text of the number.
+    :type token: str
+    """
+    try:
+        return float(token)
+    except ValueError:
+        token = token.replace('D', 'E').replace('d', 'e')
+        match = _exponent.match(token)
+        if match:
+            token = match.group(1)+'E'+match.group(2)
+        try:
+            return float(token)
+        except ValueError:
+            raise ValueError("'%s' is not a number."%token)
+
+def lookup(index, values):
+    """
+    Returns the positions in index of the values found in it.
+
+    The positions are in increasing order of value, each value only once, as
+    np.intersect1d(index, values) would return the values.
+
+    :param index: Sorted array of unique values, e.g. node numbers.
+    :type index: numpy.ndarray
+
+    :param values: The values to look up.
+    :type values: list
+    """
+    values = np.unique(values)
+    if len(index) == 0 or len(values) == 0:
+        return np.array([], dtype=int)
+    positions = np.minimum(np.searchsorted(index, values), len(index)-1)
+    return positions[index[positions] == values]
+
+def is_row(line):
+    """
+    Returns True if the line starts with a node number.
+
+    :param line: A line of an output file.
+    :type line: str
+    """
+    fields = line.split(None, 1)
+    return len(fields) > 0 and fields[0].isdigit()
+
+def contour_time(filename):
+    """
+    Returns the time of a contour file from its name.
+
+    Files written with the 'days' keyword carry the time in their name,
+    e.g. run.10.0000000_days_sca_node.avs, otherwise the output index is used,
+    e.g. 2.0 for run.00002_sca_node.avs.
+
+    :param filename: Name of the contour file.
+    :type filename: str
+    """
+    filename = os.path.splitext(filename)[0]
+    match = re.search(r'\.([0-9]+\.[0-9]*)_days', filename)
+    if match is None:
+        match = re.search(r'\.([0-9]+)_[^.]*$', filename)
+    if match is None:
+        return None
+    return float(match.group(1))
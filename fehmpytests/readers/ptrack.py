@@ -0,0 +1,79 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+import glob
+import re
+import numpy as np
+from parse import table
+import store
+
+def read_ptrk(filename):
+    """
+    Reads a Tecplot style particle tracking file.
+
+    Returns the variable names and a (row x variable) array of values. The
+    first variable is the time.
+
+    :param filename: Name of the ptrk file.
+    :type filename: str
+    """
+    with open(filename) as f:
+        lines = f.read().splitlines()
+    names = []
+    rows = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) == 0:
+            continue
+        if line.strip().upper().startswith('VARIABLES'):
+            names = re.findall(r'"([^"]*)"', line)
+        elif names and re.match(r'^[-+.0-9]', fields[0]):
+            rows.append(line)
+    return names, table(rows, len(names))
+
+class fptrk(object):
+    """
+    Particle tracking output of a FEHM simulation.
+
+    Indexing by variable gives the array of values, one per time.
+
+    :param filename: File name or glob pattern of the ptrk file.
+    :type filename: str
+
+    :param cache: Directory of the binary store of parsed files, None to
+                  parse every file.
+    :type cache: str
+    """
+    def __init__(self, filename=None, cache=None):
+        self.filename = filename
+        self.cache = cache
+        self.times = np.array([])
+        self._data = {}
+        if filename is not None:
+            for name in sorted(glob.glob(filename)):
+                names, values = store.load(read_ptrk, name, cache)
+                if len(names) == 0:
+                    continue
+                columns = np.ascontiguousarray(values.T)
+                self.times = columns[0]
+                self._data.update(zip(names[1:], columns[1:]))
+
+    def __getitem__(self, variable):
+        return self._data[variable]
+
+    def __contains__(self, variable):
+        return variable in self._data
+
+    @property
+    def variables(self):
+        return sorted(self._data)
@@ -0,0 +1,168 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Binary store of parsed files.
+
+The value returned by a reader for a file is kept in a directory named after
+the file and a hash of its contents, of the reader and of the source of the
+readers package. Arrays are saved as one .npy file per dtype and loaded
+memory-mapped, so a stored file is available without parsing or copying it
+again.
+"""
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+#Increase when a change to the store format changes the entries it writes.
+version = 1
+
+#Hash of the source of the readers package, see _source_digest().
+_source = None
+
+def key(reader, filename):
+    """
+    Returns the hash of the contents of filename, of the reader and of the
+    source of the readers, so editing any reader creates new entries.
+
+    :param reader: Function that parses filename.
+    :type reader: function
+
+    :param filename: Name of the file.
+    :type filename: str
+    """
+    digest = hashlib.sha1('%s.%s %d %s\n'%(reader.__module__, reader.__name__,
+                                           version, _source_digest()))
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _source_digest():
+    #Hashes the modules of the readers package once per process.
+    global _source
+    if _source is None:
+        digest = hashlib.sha1()
+        folder = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(folder, '*.py'))):
+            with open(path, 'rb') as f:
+                digest.update(os.path.basename(path)+'\0'+f.read())
+        _source = digest.hexdigest()
+    return _source
+
+def load(reader, filename, directory=None):
+    """
+    Returns reader(filename), from the store in directory when possible.
+
+    :param reader: Function that parses filename.
+    :type reader: function
+
+    :param filename: Name of the file.
+    :type filename: str
+
+    :param directory: Directory of the store, None to always parse.
+    :type directory: str
+    """
+    if directory is None:
+        return _parse(reader, filename)
+    entry = os.path.join(directory, os.path.basename(filename)+'.'+
+                                    key(reader, filename))
+    if os.path.isdir(entry):
+        try:
+            return _read(entry)
+        except (IOError, ValueError, KeyError):
+            pass
+    value = _parse(reader, filename)
+    _write(entry, value)
+    return value
+
+def _parse(reader, filename):
+    #Names the file in the errors of the reader.
+    try:
+        return reader(filename)
+    except ValueError as e:
+        raise ValueError('%s: %s'%(filename, e))
+
+def _read(entry):
+    with open(os.path.join(entry, 'index.json')) as f:
+        index = json.load(f)
+    arrays = {}
+    for kind in index['dtypes']:
+        path = os.path.join(entry, kind+'.npy')
+        try:
+            arrays[kind] = np.load(path, mmap_mode='r')
+        except ValueError:
+            #Empty arrays cannot be memory-mapped.
+            arrays[kind] = np.load(path)
+    return _decode(index['value'], arrays)
+
+def _write(entry, value):
+    arrays = {}
+    index = {'value': _encode(value, arrays), 'dtypes': sorted(arrays)}
+    try:
+        #Entries are renamed into place once complete.
+        tmp = tempfile.mkdtemp(dir=os.path.dirname(entry))
+    except OSError:
+        return
+    try:
+        for kind in arrays:
+            chunks = arrays[kind][0]
+            np.save(os.path.join(tmp, kind+'.npy'), np.concatenate(chunks))
+        with open(os.path.join(tmp, 'index.json'), 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp, entry)
+    except (IOError, OSError):
+        #Another process stored the same entry first.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def _encode(value, arrays):
+    #Replaces arrays in value by their place in arrays, keyed by dtype.
+    if isinstance(value, np.ndarray):
+        kind = np.dtype(value.dtype).name
+        chunks = arrays.setdefault(kind, [[], 0])
+        chunks[0].append(value.ravel())
+        chunks[1] += value.size
+        return {'array': [kind, chunks[1]-value.size, list(value.shape)]}
+    if isinstance(value, dict):
+        return {'dict': [[_encode(k, arrays), _encode(v, arrays)]
+                         for k, v in value.items()]}
+    if isinstance(value, tuple):
+        return {'tuple': [_encode(v, arrays) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v, arrays) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _decode(value, arrays):
+    if isinstance(value, dict):
+        if 'array' in value:
+            kind, offset, shape = value['array']
+            size = int(np.prod(shape))
+            return arrays[kind][offset:offset+size].reshape(shape)
+        if 'dict' in value:
+            return dict((_decode(k, arrays), _decode(v, arrays))
+                        for k, v in value['dict'])
+        return tuple(_decode(v, arrays) for v in value['tuple'])
+    if isinstance(value, list):
+        return [_decode(v, arrays) for v in value]
+    if isinstance(value, unicode):
+        try:
+            return str(value)
+        except UnicodeEncodeError:
+            return value
+    return value
@@ -0,0 +1,103 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Unit tests of the array kernels in metrics.py.
+
+Run from the fehmpytests folder with: python -m unittest test_metrics
+"""
+import unittest
+import numpy as np
+import metrics
+
+class stackTest(unittest.TestCase):
+
+    def test_padding(self):
+        values, present = metrics.stack([[1., 2., 3.], [4.]])
+        self.assertEqual(values.shape, (2, 3))
+        self.assertTrue(np.isnan(values[1, 1:]).all())
+        self.assertEqual(present.tolist(),
+                         [[True, True, True], [True, False, False]])
+
+    def test_nan_value_is_present(self):
+        values, present = metrics.stack([[1., np.nan]])
+        self.assertTrue(np.isnan(values[0, 1]))
+        self.assertTrue(present.all())
+
+    def test_array(self):
+        values, present = metrics.stack(np.zeros((2, 2), dtype=int))
+        self.assertEqual(values.dtype, float)
+        self.assertTrue(present.all())
+
+class differenceTest(unittest.TestCase):
+
+    def test_padding_is_ignored(self):
+        dif, present = metrics.stack([[1.e-10, 2.e-10], [3.e-10]])
+        old, _ = metrics.stack([[1., 1.], [1.]])
+        for measure in metrics.measures:
+            measured = metrics.difference(dif, old, measure, present=present)
+            self.assertTrue(np.isfinite(measured).all(), measure)
+            self.assertEqual(len(metrics.failures(measured, 1.e-4)), 0)
+        measured = metrics.difference(dif, old, 'max_difference',
+                                      present=present)
+        self.assertEqual(measured.tolist(), [2.e-10, 3.e-10])
+
+    def test_nan_fails(self):
+        dif, present = metrics.stack([[1.e-10, np.nan], [1.e-10]])
+        old, _ = metrics.stack([[1., 1.], [1.]])
+        for measure in metrics.measures:
+            measured = metrics.difference(dif, old, measure, present=present)
+            self.assertEqual(metrics.failures(measured, 1.e-4).tolist(), [0],
+                             measure)
+
+    def test_nan_without_mask_fails(self):
+        measured = metrics.difference(np.array([[0., np.nan]]),
+                                      np.array([[1., 1.]]), 'rms_difference')
+        self.assertEqual(metrics.failures(measured, 1.e-4).tolist(), [0])
+
+    def test_nan_old_fails_perc_difference(self):
+        measured = metrics.difference(np.array([[0., 0.]]),
+                                      np.array([[1., np.nan]]),
+                                      'perc_difference')
+        self.assertEqual(metrics.failures(measured, 1.e-4).tolist(), [0])
+
+    def test_unknown_measure(self):
+        self.assertRaises(ValueError, metrics.difference, np.zeros((1, 1)),
+                          np.zeros((1, 1)), 'mean_difference')
+
+class divergenceTest(unittest.TestCase):
+
+    def test_first_nan(self):
+        dif = np.array([[0., 0., np.nan, 0.], [0., 0., 0., 0.]])
+        first = metrics.divergence(dif, np.ones(dif.shape), 'max_difference',
+                                   1.e-4)
+        self.assertEqual(first.tolist(), [2, -1])
+
+    def test_padding_is_ignored(self):
+        dif, present = metrics.stack([[0., 1.], [0.]])
+        first = metrics.divergence(dif, np.ones(dif.shape), 'rms_difference',
+                                   1.e-4, present)
+        self.assertEqual(first.tolist(), [1, -1])
+
+class worstTest(unittest.TestCase):
+
+    def test_nan_is_worst(self):
+        dif, present = metrics.stack([[5., np.nan, -7.], [1., -2.]])
+        self.assertEqual(metrics.worst(dif, present).tolist(), [1, 1])
+
+    def test_padding_is_never_worst(self):
+        dif, present = metrics.stack([[0.], [0., 0.]])
+        self.assertEqual(metrics.worst(dif, present).tolist(), [0, 0])
+
+if __name__ == '__main__':
+    unittest.main()
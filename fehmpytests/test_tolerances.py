@@ -0,0 +1,66 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Unit tests of the tolerance specs in tolerances.py.
+
+Run from the fehmpytests folder with: python -m unittest test_tolerances
+"""
+import unittest
+import warnings
+import numpy as np
+import tolerances
+
+class thresholdsTest(unittest.TestCase):
+
+    def test_later_rule_applies(self):
+        spec = tolerances.compile_spec([
+            {'variables': ['P', 'T'], 'atol': 1.},
+            {'variables': ['T'], 'atol': 2., 'rtol': 0.5, 'nodes': [2]}])
+        atol, rtol = tolerances.thresholds(spec, (3, 2),
+                                           np.array([['P'], ['T'], ['S']]),
+                                           np.array([1, 2]))
+        self.assertEqual(atol[:2].tolist(), [[1., 1.], [1., 2.]])
+        self.assertEqual(rtol[1].tolist(), [0., 0.5])
+        self.assertTrue(np.isnan(atol[2]).all())
+
+    def test_unknown_key(self):
+        self.assertRaises(ValueError, tolerances.compile_spec,
+                          [{'variables': ['P'], 'atol': 1., 'node': [1]}])
+
+class exceededTest(unittest.TestCase):
+
+    def test_limit(self):
+        over = tolerances.exceeded(np.array([[0.5, 1.5, -2.5]]),
+                                   np.array([[1., 1., 2.]]),
+                                   np.ones((1, 3)), np.array([[0., 0., 0.5]]))
+        self.assertEqual(over.tolist(), [[False, True, True]])
+
+    def test_nan_exceeds(self):
+        over = tolerances.exceeded(np.array([[np.nan, 0.]]),
+                                   np.array([[1., np.nan]]),
+                                   np.ones((1, 2)), np.zeros((1, 2)))
+        self.assertEqual(over.tolist(), [[True, True]])
+
+    def test_uncovered_and_padding(self):
+        atol = np.array([[np.nan, 1., 1.]])
+        present = np.array([[True, True, False]])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            over = tolerances.exceeded(np.array([[5., 0., np.nan]]),
+                                       np.ones((1, 3)), atol,
+                                       np.zeros((1, 3)), present)
+        self.assertFalse(over.any())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+#***********************************************************************
+# Copyright 2014 Los Alamos National Security, LLC All rights reserved
+# Unless otherwise indicated, this information has been authored by an
+# employee or employees of the Los Alamos National Security, LLC (LANS),
+# operator of the Los Alamos National Laboratory under Contract No.
+# DE-AC52-06NA25396 with the U.S. Department of Energy. The U.S.
+# Government has rights to use, reproduce, and distribute this
+# information. The public may copy and use this information without
+# charge, provided that this  Notice and any statement of authorship are
+# reproduced on all copies. Neither the Government nor LANS makes any
+# warranty, express or  implied, or assumes any liability or
+# responsibility for the use of this information.
+#***********************************************************************
+"""
+Tolerance specs of the fehmpytests test-cases.
+
+A spec is a json list of rules, read from the file tolerances.json of a
+test-case folder. Each rule gives the absolute and relative tolerance of
+some variables, optionally only at some nodes and within a time window:
+
+    [
+        {"variables": ["P", "T"], "atol": 1e-4},
+        {"variables": ["saturation"], "atol": 1e-6, "rtol": 1e-3,
+         "nodes": [1, 2, 3], "times": [0.0, 10.0]}
+    ]
+
+A value passes a rule if |new-old| <= atol+rtol*|old|. Where rules overlap
+the later one applies. Values not covered by any rule are tested with the
+test measure and maxerr of the test-case as before.
+"""
+import json
+import numpy as np
+
+#Keys of a rule and their defaults, None where the rule applies everywhere.
+defaults = {'variables': None, 'nodes': None, 'times': None,
+            'atol': 0., 'rtol': 0.}
+
+def load(filename):
+    """
+    Reads and compiles the spec in a json file.
+
+    :param filename: Name of the spec file.
+    :type filename: str
+    """
+    with open(filename) as f:
+        return compile_spec(json.load(f))
+
+def compile_spec(rules):
+    """
+    Checks a spec and converts its node sets and time windows to arrays.
+
+    Returns a list of rules, each a dict with every key of defaults.
+
+    :param rules: The rules of the spec.
+    :type rules: list[dict]
+    """
+    compiled = []
+    for rule in rules:
+        unknown = set(rule) - set(defaults)
+        if unknown:
+            raise ValueError('Unknown tolerance keys %s.'%
+                             ', '.join(sorted(unknown)))
+        if not rule.get('variables'):
+            raise ValueError('Tolerance rule without variables.')
+        if 'atol' not in rule and 'rtol' not in rule:
+            raise ValueError('Tolerance rule without atol or rtol.')
+        values = dict(defaults)
+        values.update(rule)
+        values['variables'] = np.array([str(v) for v in values['variables']])
+        if values['nodes'] is not None:
+            values['nodes'] = np.array(values['nodes'], dtype=int)
+        if values['times'] is not None:
+            start, end = values['times']
+            values['times'] = (float(start), float(end))
+        values['atol'] = float(values['atol'])
+        values['rtol'] = float(values['rtol'])
+        compiled.append(values)
+    return compiled
+
+def thresholds(rules, shape, variables, nodes=None, times=None):
+    """
+    Returns the arrays of absolute and relative tolerance of every value.
+
+    Values no rule applies to have NaN absolute tolerance.
+
+    :param rules: Spec returned by compile_spec.
+    :type rules: list[dict]
+
+    :param shape: Shape of the values, (row x column).
+    :type shape: tuple
+
+    :param variables: Variable names, an array broadcasting to shape.
+    :type variables: numpy.ndarray
+
+    :param nodes: Node numbers broadcasting to shape, None if the values
+                  do not belong to nodes.
+    :type nodes: numpy.ndarray
+
+    :param times: Times broadcasting to shape, None if the values do not
+                  belong to times.
+    :type times: numpy.ndarray
+    """
+    atol = np.empty(shape)
+    atol.fill(np.nan)
+    rtol = np.zeros(shape)
+    for rule in rules:
+        mask = np.isin(variables, rule['variables'])
+        if rule['nodes'] is not None:
+            if nodes is None:
+                continue
+            mask = mask & np.isin(nodes, rule['nodes'])
+        if rule['times'] is not None:
+            if times is None:
+                continue
+            start, end = rule['times']
+            mask = mask & (times >= start) & (times <= end)
+        mask = np.broadcast_to(mask, shape)
+        atol[mask] = rule['atol']
+        rtol[mask] = rule['rtol']
+    return atol, rtol
+
+def exceeded(dif, old, atol, rtol, present=None):
+    """
+    Returns True where a difference is larger than its tolerance.
+
+    A NaN difference or old value that a rule covers is always exceeded.
+
+    :param dif: Differences between new and old values.
+    :type dif: numpy.ndarray
+
+    :param old: Old values, same shape as dif.
+    :type old: numpy.ndarray
+
+    :param atol: Absolute tolerances returned by thresholds.
+    :type atol: numpy.ndarray
+
+    :param rtol: Relative tolerances returned by thresholds.
+    :type rtol: numpy.ndarray
+
+    :param present: False where dif holds no value, e.g. the padding of
+                    metrics.stack, None if every value is present.
+    :type present: numpy.ndarray
+    """
+    dif = np.abs(dif)
+    covered = ~np.isnan(atol)
+    if present is not None:
+        covered = covered & present
+    limit = atol + rtol*np.abs(old)
+    #NaN limits where no rule applies are masked by covered.
+    with np.errstate(invalid='ignore'):
+        out = np.isnan(dif) | np.isnan(limit) | (dif > limit)
+    return out & covered
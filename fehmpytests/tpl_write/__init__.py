@@ -1,3 +1,3 @@
-from pest_io import tpl_write
+from pest_io import tpl_write, tpl_write_ensemble, CompiledTemplate
 
-__xall__ = ['tpl_write']
+__xall__ = ['tpl_write', 'tpl_write_ensemble', 'CompiledTemplate']
@@ -10,11 +10,16 @@ Expressions can be compiled into ast node and then evaluated
 later, using the current values in the
 """
 from __future__ import division, print_function
+import __future__
 from sys import exc_info, stdout, version_info
 import ast
 import math
-from astutils import (FROM_PY, FROM_MATH, FROM_NUMPY,
-                       NUMPY_RENAMES, ExceptionHolder)
+import numbers
+import timeit
+from collections import OrderedDict
+from types import ModuleType
+from astutils import (FROM_PY, FROM_MATH, FROM_NUMPY, NUMPY_RENAMES,
+                      COMPILE_NAMES, ExceptionHolder, NameFinder, safe_attr)
 
 from parameter import isParameter, valid_symbol_name
 
@@ -60,6 +65,23 @@ def op2func(op):
     "return function for operator nodes"
     return OPERATORS[op.__class__]
 
+# nodes of expressions that may be compiled to python code objects
+COMPILE_NODES = tuple(OPERATORS) + (
+    ast.Expression, ast.Num, ast.Str, ast.Name, ast.Load, ast.BinOp,
+    ast.UnaryOp, ast.BoolOp, ast.Compare, ast.IfExp, ast.Call, ast.keyword,
+    ast.Subscript, ast.Index, ast.Slice, ast.ExtSlice, ast.Ellipsis,
+    ast.List, ast.Tuple, ast.Dict)
+
+# values compiled expressions may read from names not in COMPILE_NAMES
+COMPILE_VALUES = (numbers.Number, str, type(u''))
+if HAS_NUMPY:
+    COMPILE_VALUES += (numpy.ndarray, numpy.generic)
+
+# operators that act elementwise on numpy arrays, used by eval_array
+ARRAY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv,
+                   ast.Mod, ast.Pow, ast.Eq, ast.NotEq, ast.Gt, ast.GtE,
+                   ast.Lt, ast.LtE, ast.UAdd, ast.USub)
+
 __version__ = '0.3.1'
 
 # holder for 'returned None' from Larch procedure
@@ -106,8 +128,15 @@ class Interpreter:
                        'subscript', 'tryexcept', 'tuple', 'unaryop',
                        'while')
 
-    def __init__(self, symtable=None, writer=None, use_numpy=True):
+    def __init__(self, symtable=None, writer=None, use_numpy=True,
+                 cache_size=256, use_compiler=False):
         self.writer = writer or stdout
+        # parsed expressions, most recently used last
+        self.cache_size = cache_size
+        self._parsed = OrderedDict()
+        # compile plain expressions to code objects, see compile_expr
+        self.use_compiler = use_compiler
+        self._compiled = OrderedDict()
 
         if symtable is None:
             symtable = {}
@@ -131,15 +160,24 @@ class Interpreter:
                 symtable[sym] = getattr(math, sym)
 
         if HAS_NUMPY:
+            # no modules, they lead to os and files, e.g. lib.npyio.os
             for sym in FROM_NUMPY:
-                if hasattr(numpy, sym):
+                if (hasattr(numpy, sym) and
+                        not isinstance(getattr(numpy, sym), ModuleType)):
                     symtable[sym] = getattr(numpy, sym)
             for name, sym in NUMPY_RENAMES.items():
                 if hasattr(numpy, sym):
                     symtable[name] = getattr(numpy, sym)
 
+        # the functions and constants compiled expressions may use
+        self._compile_symbols = dict((sym, symtable[sym])
+                                     for sym in COMPILE_NAMES
+                                     if sym in symtable)
+
         self.node_handlers = dict(((node, getattr(self, "on_%s" % node))
                                    for node in self.supported_nodes))
+        # handlers looked up by node class, filled as nodes are run
+        self._class_handlers = {}
 
     def unimplemented(self, node):
         "unimplemented nodes"
@@ -169,13 +207,83 @@ class Interpreter:
     #  run:    ast -> result
     #  eval:   string statement -> result = run(parse(statement))
     def parse(self, text):
-        """parse statement/expression to Ast representation"""
+        """parse statement/expression to Ast representation
+
+        the trees of the last cache_size texts are kept and reused, the
+        handlers never modify them."""
         self.expr  = text
+        if text in self._parsed:
+            node = self._parsed.pop(text)
+            self._parsed[text] = node
+            return node
         try:
-            return ast.parse(text)
+            node = ast.parse(text)
         except:
             self.raise_exception(None, exc=SyntaxError,
                                  msg='Syntax Error', expr=text)
+        if self.cache_size > 0:
+            self._parsed[text] = node
+            while len(self._parsed) > self.cache_size:
+                self._parsed.popitem(last=False)
+        return node
+
+    def compile_expr(self, text):
+        """compile an expression to a code object, None if not allowed
+
+        Only expressions made of the nodes in COMPILE_NODES that call
+        nothing but the functions named in COMPILE_NAMES are compiled.  The
+        code runs with the symtable as its only namespace and no builtins,
+        eval only runs it while compiled_symbols holds for its names."""
+        if text in self._compiled:
+            code = self._compiled.pop(text)
+            self._compiled[text] = code
+            return code
+        code = None
+        try:
+            tree = ast.parse(text, mode='eval')
+        except SyntaxError:
+            tree = None
+        if tree is not None and self._compilable(tree):
+            finder = NameFinder()
+            finder.visit(tree)
+            code = (compile(tree, '<asteval>', 'eval',
+                            __future__.division.compiler_flag, True),
+                    finder.names)
+        if self.cache_size > 0:
+            self._compiled[text] = code
+            while len(self._compiled) > self.cache_size:
+                self._compiled.popitem(last=False)
+        return code
+
+    def _compilable(self, tree):
+        "tree passes the checks of compile_expr"
+        for node in ast.walk(tree):
+            if not isinstance(node, COMPILE_NODES):
+                return False
+            if node.__class__ == ast.Name and node.id.startswith('__'):
+                return False
+            if node.__class__ == ast.Call and not (
+                    node.func.__class__ == ast.Name and
+                    node.func.id in COMPILE_NAMES):
+                return False
+        return True
+
+    def compiled_symbols(self, names):
+        """names of a compiled expression may be read by its code object
+
+        Names in COMPILE_NAMES must still hold the functions and constants
+        they started with, other names numbers, strings or arrays of them.
+        Anything else, Parameters too, is left to the tree walker."""
+        for name in names:
+            val = self.symtable.get(name)
+            if (name in self._compile_symbols and
+                    val is self._compile_symbols[name]):
+                continue
+            if not isinstance(val, COMPILE_VALUES):
+                return False
+            if getattr(val, 'dtype', None) is not None and val.dtype.hasobject:
+                return False
+        return True
 
     def run(self, node, expr=None, lineno=None, with_raise=True):
         """executes parsed Ast representation for an expression"""
@@ -196,9 +304,13 @@ class Interpreter:
         # get handler for this node:
         #   on_xxx with handle nodes of type 'xxx', etc
         try:
-            handler = self.node_handlers[node.__class__.__name__.lower()]
+            handler = self._class_handlers[node.__class__]
         except KeyError:
-            return self.unimplemented(node)
+            try:
+                handler = self.node_handlers[node.__class__.__name__.lower()]
+            except KeyError:
+                return self.unimplemented(node)
+            self._class_handlers[node.__class__] = handler
 
         # run the handler:  this will likely generate
         # recursive calls into this run method.
@@ -219,6 +331,22 @@ class Interpreter:
         self.lineno = lineno
         self.errmsg =  None
         self.error = []
+        if self.use_compiler:
+            code = self.compile_expr(expr)
+            if code is not None and self.compiled_symbols(code[1]):
+                try:
+                    return eval(code[0], {'__builtins__': {}}, self.symtable)
+                except Exception:
+                    # report as the tree walker does, running the expression
+                    # again would repeat any side effects of its calls
+                    try:
+                        self.raise_exception(None, expr=expr)
+                    except RuntimeError:
+                        errmsg = "\n".join(self.error[0].get_error())
+                        if not show_errors:
+                            raise RuntimeError(errmsg)
+                        print(errmsg, file=self.writer)
+                        return
         try:
             node = self.parse(expr)
         except RuntimeError:
@@ -240,6 +368,75 @@ class Interpreter:
             print(errmsg, file=self.writer)
             return
 
+    def eval_array(self, expr, values):
+        """evaluates an expression once for arrays of symbol values
+
+        values maps symbol names to numpy arrays, one entry per parameter
+        set, other names are taken from the symtable.  Only numbers, names,
+        arithmetic, comparisons, and/or/not, if-expressions and calls of
+        numpy ufuncs and numpy.where are allowed, anything else raises
+        NotImplementedError.  Both branches of an if-expression and every
+        operand of and/or are evaluated, errors are raised, not printed.
+        """
+        if not HAS_NUMPY:
+            raise NotImplementedError('numpy not available')
+        tree = self.parse(expr)
+        if len(tree.body) != 1 or tree.body[0].__class__ != ast.Expr:
+            raise NotImplementedError('not a single expression')
+        return self._run_array(tree.body[0].value, values)
+
+    def _run_array(self, node, values):
+        "evaluate a node of eval_array"
+        cls = node.__class__
+        if cls == ast.Num:
+            return node.n
+        elif cls == ast.Name:
+            if node.id in values:
+                return values[node.id]
+            elif node.id in self.symtable:
+                return self.symtable[node.id]
+            raise NameError("name '%s' is not defined" % node.id)
+        elif cls == ast.BinOp and node.op.__class__ in ARRAY_OPERATORS:
+            return op2func(node.op)(self._run_array(node.left, values),
+                                    self._run_array(node.right, values))
+        elif cls == ast.UnaryOp and node.op.__class__ in ARRAY_OPERATORS:
+            return op2func(node.op)(self._run_array(node.operand, values))
+        elif cls == ast.UnaryOp and node.op.__class__ == ast.Not:
+            return numpy.logical_not(self._run_array(node.operand, values))
+        elif cls == ast.Compare:
+            lval = self._run_array(node.left, values)
+            out = True
+            for op, rnode in zip(node.ops, node.comparators):
+                if op.__class__ not in ARRAY_OPERATORS:
+                    break
+                rval = self._run_array(rnode, values)
+                out = numpy.logical_and(out, op2func(op)(lval, rval))
+                lval = rval
+            else:
+                return out
+        elif cls == ast.BoolOp:
+            # like python, and/or give one of their operands
+            is_and = node.op.__class__ == ast.And
+            out = self._run_array(node.values[0], values)
+            for vnode in node.values[1:]:
+                val = self._run_array(vnode, values)
+                if is_and:
+                    out = numpy.where(out, val, out)
+                else:
+                    out = numpy.where(out, out, val)
+            return out
+        elif cls == ast.IfExp:
+            return numpy.where(self._run_array(node.test, values),
+                               self._run_array(node.body, values),
+                               self._run_array(node.orelse, values))
+        elif (cls == ast.Call and not node.keywords and
+              node.starargs is None and node.kwargs is None):
+            func = self._run_array(node.func, values)
+            if isinstance(func, numpy.ufunc) or func is numpy.where:
+                return func(*[self._run_array(a, values) for a in node.args])
+        raise NotImplementedError("'%s' not supported for arrays" %
+                                  cls.__name__)
+
     def dump(self, node, **kw):
         "simple ast dumper"
         return ast.dump(node, **kw)
@@ -368,10 +565,17 @@ class Interpreter:
     def on_attribute(self, node):    # ('value', 'attr', 'ctx')
         "extract attribute"
         ctx = node.ctx.__class__
+        if not safe_attr(node.attr):
+            msg = "no safe attribute '%s'" % node.attr
+            self.raise_exception(node, exc=AttributeError, msg=msg)
         if ctx == ast.Load:
             sym = self.run(node.value)
             if hasattr(sym, node.attr):
-                return getattr(sym, node.attr)
+                val = getattr(sym, node.attr)
+                if isinstance(val, ModuleType):
+                    msg = "no module attribute '%s'" % node.attr
+                    self.raise_exception(node, exc=AttributeError, msg=msg)
+                return val
             else:
                 obj = self.run(node.value)
                 fmt = "%s does not have attribute '%s'"
@@ -664,6 +868,29 @@ class Interpreter:
                                              vararg = node.args.vararg,
                                              varkws = node.args.kwarg)
 
+def benchmark(exprs=None, symbols=None, number=10000):
+    """time the tree walker and the compiled backend
+
+    returns a list of (expression, tree walker seconds, compiled seconds)
+    for number evaluations of each expression, e.g. from fehmpytests:
+    python -c "from tpl_write.asteval import benchmark; print(benchmark())"
+    """
+    if exprs is None:
+        exprs = ('x*y + 2', 'sqrt(x**2 + y**2)/(1 + exp(-y))',
+                 'x if y > 1 else log10(x)', '[x, y][1]*pi')
+    if symbols is None:
+        symbols = {'x': 1.5, 'y': 2.5}
+    out = []
+    for expr in exprs:
+        times = []
+        for use_compiler in (False, True):
+            aeval = Interpreter(use_compiler=use_compiler)
+            aeval.symtable.update(symbols)
+            times.append(min(timeit.repeat(lambda: aeval(expr), repeat=3,
+                                           number=number)))
+        out.append((expr, times[0], times[1]))
+    return out
+
 class Procedure(object):
     """Procedure: user-defined function for asteval
 
@@ -23,13 +23,12 @@ FROM_PY = ('ArithmeticError', 'AssertionError', 'AttributeError',
            'UnicodeDecodeError', 'UnicodeEncodeError', 'UnicodeError',
            'UnicodeTranslateError', 'UnicodeWarning', 'ValueError',
            'Warning', 'ZeroDivisionError', 'abs', 'all', 'any', 'bin',
-           'bool', 'bytearray', 'bytes', 'chr', 'complex', 'delattr',
-           'dict', 'dir', 'divmod', 'enumerate', 'filter', 'float',
-           'format', 'frozenset', 'getattr', 'hasattr', 'hash', 'hex',
-           'id', 'int', 'isinstance', 'len', 'list', 'map', 'max', 'min',
-           'oct', 'open', 'ord', 'pow', 'property', 'range', 'repr',
-           'reversed', 'round', 'set', 'setattr', 'slice', 'sorted', 'str',
-           'sum', 'tuple', 'type', 'zip')
+           'bool', 'bytearray', 'bytes', 'chr', 'complex', 'dict',
+           'divmod', 'enumerate', 'filter', 'float', 'format',
+           'frozenset', 'hasattr', 'hash', 'hex', 'id', 'int',
+           'isinstance', 'len', 'list', 'map', 'max', 'min', 'oct', 'ord',
+           'pow', 'range', 'repr', 'reversed', 'round', 'set', 'slice',
+           'sorted', 'str', 'sum', 'tuple', 'zip')
 
 # inherit these from python's math
 FROM_MATH = ('acos', 'acosh', 'asin', 'asinh', 'atan', 'atan2', 'atanh',
@@ -73,14 +72,14 @@ FROM_NUMPY = ('Inf', 'NAN', 'abs', 'absolute', 'add', 'alen', 'all',
               'flatnonzero', 'flexible', 'fliplr', 'flipud', 'float',
               'float32', 'float64', 'float_', 'floating', 'floor',
               'floor_divide', 'fmax', 'fmin', 'fmod', 'format_parser',
-              'frexp', 'frombuffer', 'fromfile', 'fromfunction',
-              'fromiter', 'frompyfunc', 'fromregex', 'fromstring', 'fv',
-              'generic', 'genfromtxt', 'getbufsize', 'geterr',
+              'frexp', 'frombuffer', 'fromfunction',
+              'fromiter', 'frompyfunc', 'fromstring', 'fv',
+              'generic', 'getbufsize', 'geterr',
               'geterrcall', 'geterrobj', 'gradient', 'greater',
               'greater_equal', 'hamming', 'hanning', 'histogram',
               'histogram2d', 'histogramdd', 'hsplit', 'hstack', 'hypot',
               'i0', 'identity', 'iinfo', 'imag', 'in1d', 'index_exp',
-              'indices', 'inexact', 'inf', 'info', 'infty', 'inner',
+              'indices', 'inexact', 'inf', 'infty', 'inner',
               'insert', 'int', 'int0', 'int16', 'int32', 'int64', 'int8',
               'int_', 'int_asbuffer', 'intc', 'integer', 'interp',
               'intersect1d', 'intp', 'invert', 'ipmt', 'irr', 'iscomplex',
@@ -89,39 +88,39 @@ FROM_NUMPY = ('Inf', 'NAN', 'abs', 'absolute', 'add', 'alen', 'all',
               'issctype', 'issubclass_', 'issubdtype', 'issubsctype',
               'iterable', 'ix_', 'kaiser', 'kron', 'ldexp', 'left_shift',
               'less', 'less_equal', 'lexsort', 'lib', 'linalg', 'linspace',
-              'little_endian', 'load', 'loads', 'loadtxt', 'log', 'log10',
+              'little_endian', 'log', 'log10',
               'log1p', 'log2', 'logaddexp', 'logaddexp2', 'logical_and',
               'logical_not', 'logical_or', 'logical_xor', 'logspace',
               'long', 'longcomplex', 'longdouble', 'longfloat', 'longlong',
-              'lookfor', 'ma', 'mafromtxt', 'mask_indices', 'mat', 'math',
+              'ma', 'mask_indices', 'mat', 'math',
               'matrix', 'matrixlib', 'max', 'maximum', 'maximum_sctype',
-              'may_share_memory', 'mean', 'median', 'memmap', 'meshgrid',
+              'may_share_memory', 'mean', 'median', 'meshgrid',
               'mgrid', 'min', 'minimum', 'mintypecode', 'mirr', 'mod',
               'modf', 'msort', 'multiply', 'nan', 'nan_to_num',
               'nanargmax', 'nanargmin', 'nanmax', 'nanmin', 'nansum',
-              'nbytes', 'ndarray', 'ndenumerate', 'ndfromtxt', 'ndim',
+              'nbytes', 'ndarray', 'ndenumerate', 'ndim',
               'ndindex', 'negative', 'newaxis', 'nextafter', 'nonzero',
               'not_equal', 'nper', 'npv', 'number', 'obj2sctype', 'object',
               'object0', 'object_', 'ogrid', 'ones', 'ones_like', 'outer',
-              'packbits', 'percentile', 'pi', 'piecewise', 'pkgload',
-              'place', 'pmt', 'poly', 'poly1d', 'polyadd', 'polyder',
+              'packbits', 'percentile', 'pi', 'piecewise', 'place', 'pmt',
+              'poly', 'poly1d', 'polyadd', 'polyder',
               'polydiv', 'polyfit', 'polyint', 'polymul', 'polynomial',
               'polysub', 'polyval', 'power', 'ppmt', 'prod', 'product',
               'ptp', 'put', 'putmask', 'pv', 'r_', 'rad2deg', 'radians',
               'random', 'rank', 'rate', 'ravel', 'real', 'real_if_close',
-              'rec', 'recarray', 'recfromcsv', 'recfromtxt', 'reciprocal',
+              'rec', 'recarray', 'reciprocal',
               'record', 'remainder', 'repeat', 'require', 'reshape',
               'resize', 'restoredot', 'right_shift', 'rint', 'roll',
               'rollaxis', 'roots', 'rot90', 'round', 'round_', 'row_stack',
-              's_', 'safe_eval', 'save', 'savetxt', 'savez', 'sctype2char',
+              's_', 'sctype2char',
               'sctypeDict', 'sctypeNA', 'sctypes', 'searchsorted',
               'select', 'setbufsize', 'setdiff1d', 'seterr', 'setxor1d',
               'shape', 'short', 'sign', 'signbit', 'signedinteger', 'sin',
               'sinc', 'single', 'singlecomplex', 'sinh', 'size',
-              'sometrue', 'sort', 'sort_complex', 'source', 'spacing',
+              'sometrue', 'sort', 'sort_complex', 'spacing',
               'split', 'sqrt', 'square', 'squeeze', 'std', 'str', 'str_',
               'subtract', 'sum', 'swapaxes', 'take', 'tan', 'tanh',
-              'tensordot', 'test', 'testing', 'tile', 'trace', 'transpose',
+              'tensordot', 'testing', 'tile', 'trace', 'transpose',
               'trapz', 'tri', 'tril', 'tril_indices', 'tril_indices_from',
               'trim_zeros', 'triu', 'triu_indices', 'triu_indices_from',
               'true_divide', 'trunc', 'typeDict', 'typeNA', 'typecodes',
@@ -130,12 +129,37 @@ FROM_NUMPY = ('Inf', 'NAN', 'abs', 'absolute', 'add', 'alen', 'all',
               'union1d', 'unique', 'unravel_index', 'unsignedinteger',
               'unwrap', 'ushort', 'vander', 'var', 'vdot', 'vectorize',
               'version', 'void', 'void0', 'vsplit', 'vstack', 'where',
-              'who', 'zeros', 'zeros_like')
+              'zeros', 'zeros_like')
+
+# attributes never looked up, besides those starting with '__'
+UNSAFE_ATTRS = ('func_globals', 'func_code', 'func_closure', 'func_defaults',
+                'func_dict', 'im_class', 'im_func', 'im_self', 'gi_code',
+                'gi_frame', 'f_back', 'f_builtins', 'f_code', 'f_globals',
+                'f_locals', 'tb_frame', 'tb_next', 'mro')
+
+def safe_attr(name):
+    "input is an attribute name that may be looked up"
+    return not name.startswith('__') and name not in UNSAFE_ATTRS
 
 NUMPY_RENAMES = {'ln':'log', 'asin':'arcsin', 'acos':'arccos',
                  'atan':'arctan', 'atan2':'arctan2', 'atanh':'arctanh',
                  'acosh':'arccosh', 'asinh':'arcsinh'}
 
+# numeric functions and constants compiled expressions may use, any other
+# name must hold a number or an array, see Interpreter.compile_expr
+COMPILE_NAMES = ('False', 'Inf', 'NAN', 'None', 'True', 'abs', 'absolute',
+                 'acos', 'acosh', 'arccos', 'arccosh', 'arcsin', 'arcsinh',
+                 'arctan', 'arctan2', 'arctanh', 'around', 'asin', 'asinh',
+                 'atan', 'atan2', 'atanh', 'ceil', 'clip', 'copysign', 'cos',
+                 'cosh', 'deg2rad', 'degrees', 'e', 'exp', 'exp2', 'expm1',
+                 'fabs', 'float', 'floor', 'fmax', 'fmin', 'fmod', 'hypot',
+                 'inf', 'infty', 'int', 'isfinite', 'isinf', 'isnan', 'ln',
+                 'log', 'log10', 'log1p', 'log2', 'max', 'maximum', 'mean',
+                 'min', 'minimum', 'mod', 'nan', 'pi', 'pow', 'power',
+                 'rad2deg', 'radians', 'reciprocal', 'remainder', 'rint',
+                 'round', 'sign', 'sin', 'sinh', 'sqrt', 'square', 'sum',
+                 'tan', 'tanh', 'trunc', 'where')
+
 class ExceptionHolder(object):
     "basic exception handler"
     def __init__(self, node, exc=None, msg='', expr=None, lineno=None):
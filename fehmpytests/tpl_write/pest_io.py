@@ -1,14 +1,128 @@
 ''' Utilities to handle reading and writing PEST files '''
 from asteval import Interpreter
 from glob import glob
-import re
-from numpy import recarray, array
+from multiprocessing.pool import ThreadPool
+import ast
+from numpy import recarray, array, asarray, broadcast_to, errstate, generic, isfinite
 try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
 
-def tpl_write( pardict, f, outflnm ):
+class CompiledTemplate(object):
+    ''' PEST template file split once into literal text and expression slots
+
+        The template is tokenized when the object is created. Rendering
+        evaluates each unique expression once and joins the pieces, so its
+        cost grows with the size of the template, not with the number of
+        markers times the size of the template.
+
+        :param f: File handle or file name of PEST template file
+        :type f: str or file handle
+    '''
+    def __init__( self, f ):
+        # Check if f is a string or file and read in lines
+        if isinstance( f, file ): 
+            t = f.read()
+            fnm = f.name
+            f.close()
+        else: 
+            fnm = f
+            with open( f, 'r') as fh:
+                t = fh.read()
+        self.filename = fnm
+
+        # Make sure file is PEST TPL file
+        lh, nl, t = t.partition('\n')
+        k = lh.split()
+        if len(k) < 2 or k[0] != 'ptf':
+            raise ValueError( fnm+" does not appear to be a PEST template file" )
+        tok = k[1] # Collect parameter identifier character
+        self.delimiter = tok
+
+        # Pieces alternate between literal text and marker expressions
+        pieces = t.split(tok)
+        if len(pieces) % 2 == 0:
+            # An unmatched identifier is left as literal text
+            pieces[-2:] = [tok.join(pieces[-2:])]
+        self.literals = pieces[0::2]
+        self.expressions = []
+        self._slots = []
+        index = {}
+        for m in pieces[1::2]:
+            pstr = m.strip()
+            if pstr not in index:
+                index[pstr] = len(self.expressions)
+                self.expressions.append(pstr)
+            self._slots.append(index[pstr])
+
+    def render( self, pardict, aeval=None ):
+        ''' Return the model input text for a set of parameter values
+
+            :param pardict: Dictionary of parameter values
+            :type pardict: dict
+            :param aeval: Interpreter to evaluate the expressions with, a new one if None
+            :type aeval: asteval.Interpreter
+            :returns: str
+        '''
+        if aeval is None: aeval = Interpreter()
+        for k,v in pardict.items():
+            aeval.symtable[k] = v
+        # Evaluate all unique expressions
+        return self._join( [str(aeval(pstr)) for pstr in self.expressions] )
+
+    def render_ensemble( self, names, pars, aeval=None ):
+        ''' Yield the model input text for every parameter set of an ensemble
+
+            Expressions of numbers, parameters, arithmetic, comparisons,
+            if-expressions and numpy ufuncs are evaluated once for all
+            parameter sets with Interpreter.eval_array. Other expressions,
+            and parameter sets where the result is not finite, are evaluated
+            one parameter set at a time. The text is the same as render gives.
+
+            :param names: Parameter names, as returned by read_par_files
+            :type names: list[str]
+            :param pars: Parameter values, one row of len(names) values per parameter set
+            :type pars: numpy array
+            :param aeval: Interpreter to evaluate the expressions with, a new one if None
+            :type aeval: asteval.Interpreter
+            :returns: generator of str
+        '''
+        if aeval is None: aeval = Interpreter()
+        pars = array( pars, dtype=float, ndmin=2 )
+        values = dict( (k, pars[:,i]) for i,k in enumerate(names) )
+        columns = [_eval_column( aeval, pstr, values, len(pars) ) 
+                   for pstr in self.expressions]
+        for i, row in enumerate( pars ):
+            strs = [column[i] for column in columns]
+            if None in strs:
+                for k,v in zip( names, row.tolist() ):
+                    aeval.symtable[k] = v
+                strs = [str(aeval(pstr)) if v is None else v
+                        for pstr, v in zip( self.expressions, strs )]
+            yield self._join( strs )
+
+    def _join( self, strs ):
+        # Interleave the literal text with the strings of the slots
+        out = [None]*(2*len(self._slots)+1)
+        out[0::2] = self.literals
+        out[1::2] = [strs[i] for i in self._slots]
+        return ''.join(out)
+
+    def write( self, pardict, outflnm, aeval=None ):
+        ''' Write model input file for a set of parameter values
+
+            :param pardict: Dictionary of parameter values
+            :type pardict: dict
+            :param outflnm: Name of model input file to be written
+            :type outflnm: str
+            :param aeval: Interpreter to evaluate the expressions with, a new one if None
+            :type aeval: asteval.Interpreter
+        '''
+        with open( outflnm, 'w' ) as fout:
+            fout.write( self.render( pardict, aeval ) )
+
+def tpl_write( pardict, f, outflnm, aeval=None ):
     ''' Write model input file using PEST template file
 
         :param pardict: Dictionary of parameter values
@@ -17,51 +131,129 @@ def tpl_write( pardict, f, outflnm ):
         :type f: str or file handle
         :param outflnm: Name of model input file to be written
         :type outflnm: str
+        :param aeval: Interpreter to evaluate the expressions with, e.g. Interpreter(use_compiler=True), a new one if None
+        :type aeval: asteval.Interpreter
     '''
-    # Check if f is a string or file and read in lines
-    if isinstance( f, file ): 
-        t = f.read()
-        fnm = f.name
-        f.close()
-    elif isinstance( f, str ): 
-        fnm = f
-        with open( f, 'r') as fh:
-            t = fh.read()
-            fh.close()
-
-    # Make sure file is PEST TPL file
-    lh = t.split('\n')[0]
-    k = lh.split()
-    if k[0] != 'ptf':
-        print fnm+" does not appear to be a PEST template file"
+    try:
+        tpl = CompiledTemplate( f )
+    except ValueError as e:
+        print e
         return
-    else: 
-        tok = k[1] # Collect parameter identifier character
-        t = re.sub( lh+'\n', '', t)
-
-    # Complile regex pattern
-    p = re.compile(tok+'[^'+tok+']*'+tok)
-    # Find all parameter identifiers in file
-    ms = p.findall(t)
-    pd = {} # Pattern dictionary
-    # Create evaluation interpreter
-    aeval = Interpreter()
-    for k,v in pardict.items():
-        aeval.symtable[k] = v
-    # Evaluate all unique expressions
-    for m in ms:
-        pstr = m.split(tok)[1].strip()
-        if pstr not in pd:
-            pd[m] = aeval(pstr)
-    # Perform substitutions
-    for k,v in pd.items():
-        t = re.sub( re.escape(k), str(v), t)
-
-    # Write output file
-    fout = open( outflnm, 'w' )
-    fout.write(t)
-    fout.close()
+    tpl.write( pardict, outflnm, aeval )
+
+def tpl_write_ensemble( names, pars, f, outflnm, jobs=1, aeval=None ):
+    ''' Write a model input file for every parameter set of an ensemble
+
+        The template is compiled once and its expressions are evaluated with
+        one interpreter for all parameter sets. Files are rendered one at a
+        time and, with jobs > 1, written by a pool of threads while the next
+        files are rendered.
+
+        :param names: Parameter names, as returned by read_par_files
+        :type names: list[str]
+        :param pars: Parameter values, one row of len(names) values per parameter set
+        :type pars: numpy array
+        :param f: File handle or file name of PEST template file, or the compiled template
+        :type f: str, file handle or CompiledTemplate
+        :param outflnm: Names of the model input files, one per parameter set, or a name formatted with the number of the parameter set starting at 1, e.g. 'run%04d.dat'
+        :type outflnm: str or list[str]
+        :param jobs: Number of threads writing files
+        :type jobs: int
+        :param aeval: Interpreter to evaluate the expressions with, e.g. Interpreter(use_compiler=True), a new one if None
+        :type aeval: asteval.Interpreter
+        :returns: list of file names written
+    '''
+    if isinstance( f, CompiledTemplate ): tpl = f
+    else: tpl = CompiledTemplate( f )
+    pars = array( pars, dtype=float, ndmin=2 )
+    if isinstance( outflnm, str ):
+        outflnms = [outflnm % (i+1) for i in range(len(pars))]
+    else:
+        outflnms = list(outflnm)
+    if len(outflnms) != len(pars):
+        raise ValueError( "Expected %d file names, got %d" % (len(pars), len(outflnms)) )
+    texts = tpl.render_ensemble( names, pars, aeval )
+    if jobs <= 1:
+        for t, fnm in zip( texts, outflnms ):
+            _write_text( t, fnm )
+        return outflnms
+    pool = ThreadPool( jobs )
+    try:
+        pending = []
+        for t, fnm in zip( texts, outflnms ):
+            pending.append( pool.apply_async( _write_text, (t, fnm) ) )
+            # Limit the number of rendered files held in memory
+            if len(pending) > 2*jobs: pending.pop(0).get()
+        for p in pending: p.get()
+    finally:
+        pool.close()
+        pool.join()
+    return outflnms
+
+def _write_text( t, outflnm ):
+    with open( outflnm, 'w' ) as fout:
+        fout.write( t )
+
+def _eval_column( aeval, pstr, values, n ):
+    # Strings of an expression for n parameter sets, None where the
+    # expression has to be evaluated one parameter set at a time
+    try:
+        kind = _kind( aeval, ast.parse(pstr).body[0].value, values )
+        if kind is None: return [None]*n
+        with errstate( all='ignore' ):
+            out = broadcast_to( asarray( aeval.eval_array( pstr, values ) ), (n,) )
+    except Exception:
+        # Unsupported or failing expressions are left to the interpreter,
+        # which reports errors as for a single parameter set
+        return [None]*n
+    if kind == 'numpy': strs = [str(v) for v in out]
+    else: strs = [str(kind(v)) for v in out.tolist()]
+    if out.dtype.kind in 'fc':
+        for i in (~isfinite(out)).nonzero()[0]:
+            strs[i] = None
+    return strs
+
+def _kind( aeval, node, values ):
+    # Type of the value of node for a single parameter set: 'numpy' for a
+    # numpy scalar, float, int or bool, None if unknown or if it depends on
+    # the parameter set. Arrays promote the values of all sets to one dtype,
+    # this restores the type the interpreter would give.
+    cls = node.__class__
+    if cls == ast.Num:
+        return _python_kind( node.n )
+    elif cls == ast.Name:
+        if node.id in values: return float
+        return _python_kind( aeval.symtable.get(node.id) )
+    elif cls == ast.Call:
+        return 'numpy'
+    elif cls == ast.Compare or (cls == ast.UnaryOp and node.op.__class__ == ast.Not):
+        return bool
+    elif cls == ast.UnaryOp:
+        kind = _kind( aeval, node.operand, values )
+        if kind is bool: return int
+        return kind
+    elif cls == ast.BinOp:
+        kinds = set( [_kind( aeval, n, values ) for n in (node.left, node.right)] )
+        if None in kinds: return None
+        elif 'numpy' in kinds: return 'numpy'
+        elif float in kinds or node.op.__class__ == ast.Div: return float
+        elif node.op.__class__ == ast.Pow: return None
+        return int
+    elif cls == ast.BoolOp:
+        kinds = set( [_kind( aeval, n, values ) for n in node.values] )
+    elif cls == ast.IfExp:
+        kinds = set( [_kind( aeval, n, values ) for n in (node.body, node.orelse)] )
+    else:
+        return None
+    if len(kinds) == 1: return kinds.pop()
+    return None
 
+def _python_kind( v ):
+    if isinstance( v, generic ): return 'numpy'
+    elif isinstance( v, bool ): return bool
+    elif isinstance( v, (int, long) ): return int
+    elif isinstance( v, float ): return float
+    return None
 def read_par_files( *files ):
     ''' Read in one or more PEST parameter files
 